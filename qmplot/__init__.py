@@ -1,9 +1,10 @@
 import matplotlib
-from .modules import manhattanplot, qqplot, qqnorm
+from .modules import manhattanplot, qqplot, qqnorm, genomic_inflation, clump, AssociationData
+from .utils import read_sumstats, read_sumstats_regions
 
 matplotlib.rcParams['ps.fonttype']     = 42
 matplotlib.rcParams['pdf.fonttype']    = 42
 matplotlib.rcParams['font.sans-serif'] = ["Arial","Lucida Sans","DejaVu Sans","Lucida Grande","Verdana"]
 matplotlib.rcParams['font.family']     = 'sans-serif'
 
-__all__ = ["manhattanplot", "qqplot", "qqnorm"]
+__all__ = ["manhattanplot", "qqplot", "qqnorm", "genomic_inflation", "clump", "AssociationData", "read_sumstats", "read_sumstats_regions"]
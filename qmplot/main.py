@@ -4,9 +4,15 @@ Author: Shujia Huang
 Date: 2021-02-04 12:01:34
 """
 import argparse
-import pandas as pd
+import glob
+import os
+import sys
 
-from qmplot import manhattanplot, qqplot
+import numpy as np
+
+from qmplot import manhattanplot, qqplot, genomic_inflation, read_sumstats, read_sumstats_regions, \
+    AssociationData
+from qmplot.utils import parse_region
 
 
 def parse_commandline_args():
@@ -15,9 +21,24 @@ def parse_commandline_args():
     desc = ("qmplot: Creates high-quality manhattan and QQ plots from PLINK association output (or "
             "any dataframe with chromosome, position, and p-value).")
     cmdparser = argparse.ArgumentParser(description=desc)
-    cmdparser.add_argument("-I", "--input", dest="input", type=str, required=True, help="Input file")
+    cmdparser.add_argument("-I", "--input", dest="input", type=str, default=None,
+                           help="Input file, could be plain text, gzip, bgzip or zstd compressed, "
+                                "or a Parquet/Arrow file (or a Parquet dataset directory). A glob "
+                                "pattern of input files with --batch, e.g.: 'gwas/*.tsv.gz'.")
     cmdparser.add_argument("-O", "--outprefix", dest="outprefix", type=str, required=True,
-                           help="The prefix of output file")
+                           help="The prefix of output file. In batch mode, the outputs of each input "
+                                "are <outprefix>.<input name>.*, the input name is the file name "
+                                "without the file type and compression suffixes, and the directory of "
+                                "the prefix is created if it doesn't exist.")
+    cmdparser.add_argument("--batch", dest="batch", action="store_true",
+                           help="Batch mode: plot all the input files matched by the glob pattern -I.")
+    cmdparser.add_argument("--manifest", dest="manifest", type=str, default=None,
+                           help="Batch mode: plot all the input files in this manifest, one input "
+                                "file per line and an optional output prefix after a tab. The lines "
+                                "start with '#' are skipped.")
+    cmdparser.add_argument("-w", "--workers", dest="workers", type=int, default=1,
+                           help="Number of worker processes for plotting the input files in batch "
+                                "mode, each worker plots one file at a time. [1]")
     cmdparser.add_argument("--outfiletype", dest="outfiletype", type=str, required=False, default="png",
                            help="The file type of output plot. [png]")
 
@@ -28,6 +49,42 @@ def parse_commandline_args():
     cmdparser.add_argument("--pvalue", dest="pv", type=str, default="P",
                            help="The column name for the P value ID. [P]")
 
+    cmdparser.add_argument("--chr", dest="chr", type=str, default=None,
+                           help="Only plot this chromosome, e.g.: 8 or chr8. Only the data of this "
+                                "chromosome will be loaded from Parquet/Arrow input. Default: None")
+    cmdparser.add_argument("--region", dest="region", type=str, action="append", default=None,
+                           help="Only plot the sites in this region, e.g.: chr8:1,000,000-2,000,000. "
+                                "The input must be bgzipped and tabix-indexed. This option can be "
+                                "used multiple times, one manhattan plot (no Q-Q plot) will be created "
+                                "for each region: <outprefix>.<chrom>_<start>_<end>.manhattan.<outfiletype>.")
+    cmdparser.add_argument("--chunksize", dest="chunksize", type=int, default=None,
+                           help="Read the input file in blocks of this many rows and only keep the "
+                                "columns which are needed by the plots. Recommend for very large "
+                                "input. Default: None, load the whole file at once.")
+    cmdparser.add_argument("--pvalue-dtype", dest="p_dtype", type=str, choices=["float64", "float32"],
+                           default="float64", help="The dtype for storing P values in memory, float32 "
+                                                   "halves the memory for very large input. [float64]")
+    cmdparser.add_argument("-t", "--threads", dest="threads", type=int, default=1,
+                           help="Number of threads for decompressing bgzipped input. [1]")
+    cmdparser.add_argument("--cache-dir", dest="cache_dir", type=str, default=None,
+                           help="Keep the loaded columns of the input in this directory, the next run "
+                                "on the same input (unchanged) with the same columns loads them from "
+                                "here instead of parsing the input again. Not used with --region. "
+                                "Default: None")
+    cmdparser.add_argument("--cache-max-size", dest="cache_max_size", type=float, default=20,
+                           help="The largest size in GB of --cache-dir, the least recently used "
+                                "inputs are removed from it when it's exceeded. [20]")
+
+    cmdparser.add_argument("--lambda", dest="is_lambda", action="store_true",
+                           help="Write the genomic inflation factors (lambda_GC, lambda_1000 and per-"
+                                "chromosome lambdas) to <outprefix>.lambda.tsv.")
+    cmdparser.add_argument("--n-cases", dest="n_cases", type=int, default=None,
+                           help="The number of cases for lambda_1000. Default: None")
+    cmdparser.add_argument("--n-controls", dest="n_controls", type=int, default=None,
+                           help="The number of controls for lambda_1000. Default: None")
+    cmdparser.add_argument("--no-plot", dest="no_plot", action="store_true",
+                           help="Do not create any plot, e.g.: only calculate lambda by --lambda.")
+
     cmdparser.add_argument("-T", "--title", dest="title", type=str, help="Title of plot", default=None)
     cmdparser.add_argument("-P", "--sign-mark-pvalue", dest="sign_pvalue", type=float,
                            help="Genome wide significant p-value sites. [5e-8]", default=5e-8)
@@ -37,55 +94,102 @@ def parse_commandline_args():
 
     cmdparser.add_argument("--ld-block-size", dest="ld_block_size", type=int, default=500000,
                            help="The size of LD block for finding top SNPs. default: 500000")
+    cmdparser.add_argument("--max-labels", dest="max_labels", type=int, default=None,
+                           help="The largest number of top SNPs to annotate, the ones with the "
+                                "smallest P values are kept. Default: None")
+    cmdparser.add_argument("--max-labels-per-chrom", dest="max_labels_per_chrom", type=int, default=None,
+                           help="The largest number of top SNPs to annotate in each chromosome. "
+                                "Default: None")
+    cmdparser.add_argument("--label-min-spacing", dest="label_min_spacing", type=float, default=None,
+                           help="The smallest distance in points between two annotated top SNPs "
+                                "in the plot. Default: None")
+    cmdparser.add_argument("--label-placer", dest="label_placer", type=str, choices=["adjust", "sweep"],
+                           default="adjust", help="Place the annotations of top SNPs by iterative "
+                                                  "repulsion (adjust) or by a fast deterministic "
+                                                  "sweep in slots above the peaks (sweep). [adjust]")
+    cmdparser.add_argument("--label-time-limit", dest="label_time_limit", type=float, default=None,
+                           help="The time budget in seconds for adjusting the annotations of top "
+                                "SNPs by --label-placer adjust, the best layout seen is kept when "
+                                "it's reached. Default: None")
+    cmdparser.add_argument("--decimate", dest="decimate", action="store_true",
+                           help="Only draw one point per pixel per color for the non-significant "
+                                "sites (P > 1e-3) in manhattan plot, much faster for large input.")
+    cmdparser.add_argument("--render", dest="render", type=str, choices=["scatter", "density"],
+                           default="scatter", help="Draw the sites with P > 1e-3 in manhattan plot as "
+                                                   "scatter or as a density image, which is for 100M+ "
+                                                   "sites. [scatter]")
+    cmdparser.add_argument("--thin-qq", dest="thin_qq", action="store_true",
+                           help="Only draw the 10000 smallest P values exactly in Q-Q plot and bin "
+                                "the others, much faster for large input.")
+    cmdparser.add_argument("--qq-method", dest="qq_method", type=str, choices=["sort", "histogram"],
+                           default="sort", help="Compute the Q-Q plot quantiles by sorting all the P "
+                                                "values, or by the 10000 smallest P values and a "
+                                                "histogram of the others, which is O(n) for 50M+ "
+                                                "P values. [sort]")
+    cmdparser.add_argument("--rasterize", dest="rasterize", action="store_true",
+                           help="Rasterize the dense points at --dpi and keep the axes, lines, "
+                                "significant sites and texts as vector graphics for PDF/SVG output.")
     cmdparser.add_argument("--dpi", dest="dpi", type=float,
                            help="The resolution in dots-pet-inch for plot. [300]", default=300)
     cmdparser.add_argument("--display", dest="display", action="store_true", 
                            help="Display the plot in screen.")
 
     args = cmdparser.parse_args()
+    if args.manifest is None and args.input is None:
+        cmdparser.error("one of -I/--input or --manifest is required.")
+    if args.manifest is not None and args.input is not None:
+        cmdparser.error("-I/--input and --manifest can't be set simultaneously.")
+    if (args.batch or args.manifest is not None) and args.display:
+        cmdparser.error("--display can't be used in batch mode.")
+    if args.workers < 1:
+        cmdparser.error("--workers must be a positive integer.")
+    if args.region and args.chr is not None:
+        cmdparser.error("--region and --chr can't be set simultaneously.")
+    if (args.n_cases is None) != (args.n_controls is None):
+        cmdparser.error("--n-cases and --n-controls must be set simultaneously.")
 
-    return args
-
-
-def main():
-    kwargs = parse_commandline_args()
+    if args.batch or args.manifest is not None:
+        try:
+            args.jobs = _batch_jobs(args)
+        except OSError as e:
+            cmdparser.error("can't read --manifest %s: %s" % (args.manifest, e.strerror))
+        except ValueError as e:
+            cmdparser.error(str(e))
 
-    if not kwargs.display:
-        import matplotlib
-        # Using agg, which is a non-GUI backend, so cannot show the plot in screen.
-        matplotlib.use("agg")
+    return args
 
-    import matplotlib.pyplot as plt
 
-    # loading data
-    data = pd.read_table(kwargs.input, sep="\t")
-    data = data[[kwargs.chrom, kwargs.pos, kwargs.pv, kwargs.m_id]].dropna(how="any", axis=0)  # clean data
-    data[[kwargs.chrom]] = data[[kwargs.chrom]].astype(str)
+def _strip_chr(data, chrom):
+    """Cut the 'chr' at the start of the chromosomal names in ``data``, a DataFrame
+    or an AssociationData."""
+    if isinstance(data, AssociationData):
+        data.data = _strip_chr(data.data, chrom)
+        data.chrom_names = np.array([c[3:] if c.startswith("chr") else c for c in data.chrom_names],
+                                    dtype=object)
+        return data
 
-    if data[kwargs.chrom][0].startswith("chr"):
+    if data[chrom].iloc[0].startswith("chr"):
         print("[WARNING] Find 'chr' is the start characters of chromosomal name, this program will "
               "enhance cut the first 3 characters when generate manhattan plot. If you want to keep the "
               "original name please write new Python codes by using qmplot as a Python package and "
               "import manhattanplot() function from qmplot then generate the plot by yourself. You "
               "can find more detail of tutorials in github: <https://github.com/ShujiaHuang/qmplot>.")
 
-    data[kwargs.chrom] = data[kwargs.chrom].map((lambda x: x[3:] if x.startswith("chr") else x))
+    data[chrom] = data[chrom].cat.rename_categories(lambda x: x[3:] if x.startswith("chr") else x)
+    return data
 
-    # common parameters for plotting
-    plt_params = {
-        "pdf.fonttype": 42,
-        "font.sans-serif": "Arial",
-        "legend.fontsize": 14,
-        "axes.titlesize": 18,
-        "axes.labelsize": 16,
-        "xtick.labelsize": 14,
-        "ytick.labelsize": 14
-    }
-    plt.rcParams.update(plt_params)
 
-    # Create a manhattan plot
+def _plot_manhattan(data, kwargs, outprefix, chr_id=None, xlim=None):
+    """Create a manhattan plot by the commandline options."""
+    import matplotlib.pyplot as plt
+
+    text_kws = {"fontsize": 12,  # The fontsize of annotate text
+                "arrowprops": dict(arrowstyle="-", color="k", alpha=0.6)}
+    if kwargs.label_placer == "adjust" and kwargs.label_time_limit is not None:
+        text_kws["time_limit"] = kwargs.label_time_limit
+
     f, ax = plt.subplots(figsize=(12, 4), facecolor='w', edgecolor='k', constrained_layout=True)
-    xtick = set(list(map(str, range(1, 15))) + ['16', '18', '20', '22', 'X'])
+    xtick = set(list(map(str, range(1, 15))) + ['16', '18', '20', '22', 'X']) if chr_id is None else None
     manhattanplot(data=data, chrom=kwargs.chrom, pos=kwargs.pos, pv=kwargs.pv,
                   marker=".",
 
@@ -94,8 +198,9 @@ def main():
                   snp=kwargs.m_id,
 
                   title=kwargs.title,
-                  xtick_label_set=xtick,  # CHR='8', # specific showing the chromosome 8th
-                  xlabel="Chromosome",
+                  xtick_label_set=xtick,
+                  CHR=chr_id,  # specific showing the chromosome
+                  xlabel="Chromosome" if chr_id is None else "Chromosome %s" % chr_id,
                   ylabel=r"$-log_{10}{(P)}$",
 
                   sign_line_cols=["#D62728", "#2CA02C"],
@@ -103,26 +208,279 @@ def main():
 
                   is_annotate_topsnp=True if kwargs.m_id is not None else False,
                   ld_block_size=kwargs.ld_block_size,
-                  text_kws={"fontsize": 12,  # The fontsize of annotate text
-                            "arrowprops": dict(arrowstyle="-", color="k", alpha=0.6)},
+                  max_labels=kwargs.max_labels,
+                  max_labels_per_chrom=kwargs.max_labels_per_chrom,
+                  label_min_spacing=kwargs.label_min_spacing,
+                  label_placer=kwargs.label_placer,
+                  decimate=kwargs.decimate,
+                  render=kwargs.render,
+                  render_dpi=kwargs.dpi,
+                  rasterized=kwargs.rasterize,
+                  text_kws=text_kws,
+                  xlim=xlim,
                   ax=ax)
 
-    plt.savefig(kwargs.outprefix + ".manhattan." + kwargs.outfiletype, dpi=kwargs.dpi)
+    plt.savefig(outprefix + ".manhattan." + kwargs.outfiletype, dpi=kwargs.dpi)
     if kwargs.display:
         plt.show()
 
-    # Create a Q-Q plot
+    plt.close(f)
+    return
+
+
+def _plot_qq(data, kwargs, outprefix):
+    """Create a Q-Q plot by the commandline options."""
+    import matplotlib.pyplot as plt
+
     f, ax = plt.subplots(figsize=(6, 6), facecolor="w", edgecolor="k", constrained_layout=True)
-    qqplot(data=data[kwargs.pv],
+    qqplot(data=data if isinstance(data, AssociationData) else data[kwargs.pv],
            title=kwargs.title,
            marker="o",
            xlabel=r"Expected $-log_{10}{(P)}$",
            ylabel=r"Observed $-log_{10}{(P)}$",
+           rasterized=kwargs.rasterize,
+           thin=kwargs.thin_qq,
+           method=kwargs.qq_method,
            ax=ax)
 
-    plt.savefig(kwargs.outprefix + ".QQ." + kwargs.outfiletype, dpi=kwargs.dpi)
+    plt.savefig(outprefix + ".QQ." + kwargs.outfiletype, dpi=kwargs.dpi)
     if kwargs.display:
         plt.show()
 
+    plt.close(f)
+    return
+
+
+def _write_lambda(data, kwargs, outprefix):
+    """Write the genomic inflation factors of all the sites and of each chromosome."""
+    if isinstance(data, AssociationData):
+        result = genomic_inflation(data, strata="chrom", n_cases=kwargs.n_cases, n_controls=kwargs.n_controls)
+    else:
+        result = genomic_inflation(data[kwargs.pv], strata=data[kwargs.chrom],
+                                   n_cases=kwargs.n_cases, n_controls=kwargs.n_controls)
+
+    fname = outprefix + ".lambda.tsv"
+    with open(fname, "w") as out:
+        out.write("#CHROM\tN\tLAMBDA_GC\tLAMBDA_1000\n")
+        for name, r in [("ALL", result)] + list(result["strata"].items()):
+            out.write("%s\t%d\t%.6f\t%s\n" % (name, r["n"], r["lambda_gc"],
+                                               "NA" if r["lambda_1000"] is None else "%.6f" % r["lambda_1000"]))
+
+    print("[INFO] lambda_GC = %.4f, written to %s" % (result["lambda_gc"], fname))
+    return
+
+
+def _setup_matplotlib(display=False):
+    """Set the backend and the common parameters for plotting."""
+    import matplotlib
+    if not display:
+        # Using agg, which is a non-GUI backend, so cannot show the plot in screen.
+        matplotlib.use("agg")
+
+    import matplotlib.pyplot as plt
+
+    # common parameters for plotting
+    plt_params = {
+        "pdf.fonttype": 42,
+        "font.sans-serif": "Arial",
+        "legend.fontsize": 14,
+        "axes.titlesize": 18,
+        "axes.labelsize": 16,
+        "xtick.labelsize": 14,
+        "ytick.labelsize": 14
+    }
+    plt.rcParams.update(plt_params)
+    return
+
+
+def _run(kwargs, infile, outprefix):
+    """Create the plots (and lambda) of one input file."""
+    load_kws = dict(chrom=kwargs.chrom, pos=kwargs.pos, pv=kwargs.pv, snp=kwargs.m_id,
+                    sign_marker_p=kwargs.sign_pvalue, p_dtype=kwargs.p_dtype, threads=kwargs.threads)
+    if kwargs.region:
+        # Regional plots: all the regions are read from one indexed file handle.
+        for region, data in zip(kwargs.region, read_sumstats_regions(infile, kwargs.region, **load_kws)):
+            if data.empty:
+                print("[WARNING] No data found in region %s, skip it." % region)
+                continue
+
+            region_tag = region.replace(",", "").replace(":", "_").replace("-", "_")
+            if kwargs.is_lambda:
+                _write_lambda(data, kwargs, outprefix + "." + region_tag)
+            if kwargs.no_plot:
+                continue
+
+            data = _strip_chr(data, kwargs.chrom)
+            seqid = parse_region(region)[0]
+            chr_id = seqid[3:] if seqid.startswith("chr") else seqid
+            _plot_manhattan(data, kwargs, outprefix + "." + region_tag, chr_id=chr_id,
+                            xlim=(data[kwargs.pos].min(), data[kwargs.pos].max()))
+
+        if not kwargs.no_plot:
+            print(">>>>>>>>>>>>>>>>> Create regional Manhattan plots done <<<<<<<<<<<<<<<<<")
+        return
+
+    # loading data
+    chr_id = None
+    if kwargs.chr is not None:
+        chr_id = kwargs.chr[3:] if kwargs.chr.startswith("chr") else kwargs.chr
+
+    data = read_sumstats(infile, CHR=[chr_id, "chr" + chr_id] if chr_id is not None else None,
+                         chunksize=kwargs.chunksize, cache_dir=kwargs.cache_dir,
+                         cache_max_size=int(kwargs.cache_max_size * (1 << 30)), **load_kws)
+    if kwargs.no_plot:
+        if kwargs.is_lambda:
+            _write_lambda(data, kwargs, outprefix)
+        return
+
+    # Validate the data and compute the coordinates, -log10(P) and the sorted P
+    # values once for lambda and both of the plots.
+    dataset = AssociationData(data, chrom=kwargs.chrom, pos=kwargs.pos, pv=kwargs.pv, snp=kwargs.m_id)
+    if kwargs.is_lambda:
+        _write_lambda(dataset, kwargs, outprefix)
+
+    dataset = _strip_chr(dataset, kwargs.chrom)
+
+    # Create a manhattan plot
+    _plot_manhattan(dataset, kwargs, outprefix, chr_id=chr_id)
+
+    # Create a Q-Q plot
+    _plot_qq(dataset, kwargs, outprefix)
+
     print(">>>>>>>>>>>>>>>>> Create Manhattan and Q-Q plots done <<<<<<<<<<<<<<<<<")
     return
+
+
+def _input_name(infile):
+    """The file name of ``infile`` without the file type and compression suffixes."""
+    name = os.path.basename(os.path.normpath(infile))
+    for suffixes in ([".gz", ".bgz", ".zst", ".bz2", ".xz"],
+                     [".tsv", ".txt", ".csv", ".parquet", ".arrow", ".feather", ".ipc"]):
+        for suffix in suffixes:
+            if name.lower().endswith(suffix) and len(name) > len(suffix):
+                name = name[:-len(suffix)]
+                break
+
+    return name
+
+
+def _batch_jobs(kwargs):
+    """The (input file, output prefix) of each input in batch mode."""
+    if kwargs.manifest is not None:
+        jobs = []
+        with open(kwargs.manifest) as fh:
+            for line in fh:
+                if not line.strip() or line.startswith("#"):
+                    continue
+
+                fields = line.rstrip("\r\n").split("\t")
+                infile = fields[0].strip()
+                outprefix = fields[1].strip() if len(fields) > 1 and fields[1].strip() else \
+                    kwargs.outprefix + "." + _input_name(infile)
+                jobs.append((infile, outprefix))
+    else:
+        jobs = [(f, kwargs.outprefix + "." + _input_name(f)) for f in sorted(glob.glob(kwargs.input))]
+
+    if not jobs:
+        raise ValueError("no input file found by %s." % (
+            "--manifest " + kwargs.manifest if kwargs.manifest is not None else "-I " + kwargs.input))
+
+    seen = {}
+    for infile, outprefix in jobs:
+        if outprefix in seen:
+            raise ValueError("%s and %s have the same output prefix: %s, please set the "
+                             "output prefixes in --manifest." % (seen[outprefix], infile, outprefix))
+        seen[outprefix] = infile
+
+    return jobs
+
+
+def _run_job(job):
+    """Run one batch job, an error is returned instead of raised so that one bad
+    input doesn't abort the others."""
+    kwargs, infile, outprefix = job
+    try:
+        _run(kwargs, infile, outprefix)
+    except Exception as e:
+        import matplotlib.pyplot as plt
+        plt.close("all")
+        return infile, "%s: %s" % (type(e).__name__, e)
+
+    return infile, None
+
+
+def _pool_map(jobs, workers):
+    """Run ``jobs`` on a new pool of ``workers`` processes and yield the result
+    of each job as it's done.
+
+    If a worker process is terminated abruptly (e.g. killed by the OOM killer),
+    all the unfinished jobs are lost with the pool, so they are run again one by
+    one, each in a new worker process, and only the job which kills its worker
+    again fails.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    is_broken = {}
+    with ProcessPoolExecutor(workers, initializer=_setup_matplotlib) as pool:
+        futures = {pool.submit(_run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                is_broken[future] = True
+
+    broken = [job for future, job in futures.items() if is_broken.get(future)]
+    if len(jobs) == 1 and broken:
+        yield jobs[0][1], "the worker process was terminated abruptly (e.g. killed by the OOM killer)"
+    elif broken:
+        print("[WARNING] A worker process was terminated abruptly, run the %d unfinished "
+              "input files again one by one." % len(broken))
+        for job in broken:
+            for result in _pool_map([job], 1):
+                yield result
+
+
+def _run_batch(kwargs):
+    """Plot all the input files of batch mode on a pool of worker processes.
+
+    The workers are started once and take the files one by one, so the modules
+    are imported only once in each worker.
+    """
+    jobs = [(kwargs, infile, outprefix) for infile, outprefix in kwargs.jobs]
+    workers = min(kwargs.workers, len(jobs))
+
+    # The output directories, e.g. "plots" of "-O plots/release", are created
+    # once here instead of by the workers.
+    for outdir in sorted(set(os.path.dirname(outprefix) for _, _, outprefix in jobs) - {""}):
+        os.makedirs(outdir, exist_ok=True)
+
+    print("[INFO] Plotting %d input files with %d worker(s)." % (len(jobs), workers))
+
+    results = map(_run_job, jobs) if workers == 1 else _pool_map(jobs, workers)
+    failed = []
+    for infile, error in results:
+        if error is None:
+            print("[INFO] Done: %s" % infile)
+        else:
+            failed.append(infile)
+            print("[ERROR] Failed to plot %s: %s" % (infile, error))
+
+    print("[INFO] %d input files done, %d failed." % (len(jobs) - len(failed), len(failed)))
+    for infile in failed:
+        print("[INFO] Failed: %s" % infile)
+
+    return len(failed)
+
+
+def main():
+    kwargs = parse_commandline_args()
+    _setup_matplotlib(kwargs.display)
+
+    if kwargs.batch or kwargs.manifest is not None:
+        if _run_batch(kwargs):
+            sys.exit(1)
+        return
+
+    _run(kwargs, kwargs.input, kwargs.outprefix)
+    return
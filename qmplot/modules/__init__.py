@@ -1,2 +1,5 @@
 from ._manhattan import manhattanplot
 from ._qq import qqplot, qqnorm
+from ._inflation import genomic_inflation
+from ._clump import clump
+from ._dataset import AssociationData
@@ -0,0 +1,165 @@
+"""Functions for clumping the significant sites into blocks and finding the
+lead (top) site of each block.
+
+Copyright (c) Shujia Huang
+Date: 2026-10-18
+
+"""
+import numpy as np
+from pandas import DataFrame, factorize
+
+from ..utils import check_numeric, check_pvalues
+
+
+def clump(data, chrom="#CHROM", pos="POS", pv="P", snp=None, sign_marker_p=5e-8, ld_block_size=50000):
+    """Clump the significant sites into blocks and find the lead site of each
+    block.
+
+    The significant sites (P <= ``sign_marker_p``) of each chromosome are sorted
+    by position and a new block starts whenever the distance between two
+    neighbouring significant sites is larger than ``ld_block_size``. The lead
+    site is the one with the smallest P value in the block. Blocks never cross
+    chromosomes.
+
+    Parameters
+    ----------
+    data : DataFrame.
+        A DataFrame with columns "#CHROM," "POS," "P," and optionally, "SNP."
+
+    chrom : string, default is "#CHROM", optional
+        A string denoting the column name for chromosome.
+
+    pos : string, default is "POS", optional.
+        A string denoting the column name for chromosomal position.
+
+    pv : string, default is "P", optional.
+        A string denoting the column name for P values.
+
+    snp : string, or None, optional.
+        A string denoting the column name for the SNP IDs, which will be kept
+        in the output if provided.
+
+    sign_marker_p : float, default is 5e-8, optional.
+        The P value cutoff of the significant sites.
+
+    ld_block_size : integer, default is 50000, optional
+        The largest distance between two neighbouring significant sites in a
+        block.
+
+    Returns
+    -------
+    leads : DataFrame
+        One row for each block, which keeps the index of the lead site in ``data``
+        and has the columns ``chrom``, ``pos``, ``pv`` (and ``snp``) of the lead
+        site, and "START", "END": the positions of the first and last significant
+        sites in the block and "N_SIGN": the number of significant sites in the
+        block. The rows are in the order of chromosomes in ``data`` and positions.
+
+    Examples
+    --------
+        >>> import pandas as pd
+        >>> from qmplot import clump
+        >>> df = pd.read_table("tests/data/gwas_plink_result.tsv", sep="\\t")
+        >>> df = df.dropna(how="any", axis=0)
+        >>> leads = clump(df, snp="ID", sign_marker_p=1e-6, ld_block_size=50000)
+    """
+    if not isinstance(data, DataFrame):
+        raise ValueError("[ERROR] Input data must be a pandas.DataFrame.")
+    for c in [chrom, pos, pv] + ([snp] if snp is not None else []):
+        if c not in data:
+            raise ValueError("[ERROR] Column \"%s\" not found!" % c)
+
+    p_value = check_pvalues(data[pv], name=pv)
+    sign_index = np.flatnonzero(p_value <= sign_marker_p)
+
+    codes, _ = factorize(data[chrom].iloc[sign_index], sort=False)
+    positions = data[pos].to_numpy()[sign_index]
+    if positions.dtype.kind not in "iuf":
+        positions = check_numeric(positions, name=pos)
+    lead, start, end, n_sign = _clump_index(codes, positions, p_value[sign_index], ld_block_size)
+
+    leads = data.iloc[sign_index[lead]][[chrom, pos, pv] + ([snp] if snp is not None else [])].copy()
+    leads["START"] = start
+    leads["END"] = end
+    leads["N_SIGN"] = n_sign
+    return leads
+
+
+def _clump_index(codes, positions, p_value, ld_block_size):
+    """Clump the sites by the chromosome ``codes`` and ``positions``, all the
+    sites are expected to be significant.
+
+    Returns
+    -------
+    (lead, start, end, n_sign) : the index of the lead site (the smallest P
+        value, the first one by position if tie) of each block, the first and
+        last positions and the number of sites of each block, in the order of
+        chromosome codes and positions.
+    """
+    if len(codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.asarray(positions)[empty], np.asarray(positions)[empty], empty
+
+    codes = np.asarray(codes)
+    positions = np.asarray(positions)
+    order = np.lexsort((positions, codes))
+    codes, positions = codes[order], positions[order]
+
+    # A new block starts at a new chromosome or a gap which is larger than ``ld_block_size``
+    is_new = np.r_[True, (codes[1:] != codes[:-1]) |
+                         (np.diff(positions.astype(np.float64)) > ld_block_size)]
+    starts = np.flatnonzero(is_new)
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    # Segment-wise argmin of P: sort by (block, P), the first one of each block.
+    block = np.cumsum(is_new) - 1
+    by_p = np.lexsort((np.asarray(p_value)[order], block))
+    return order[by_p[starts]], positions[starts], positions[ends], ends - starts + 1
+
+
+class _IntervalIndex(object):
+    """A sorted index of the intervals [start, end] (inclusive) on chromosomes
+    for looking up a large number of sites at once.
+
+    The overlapping intervals on the same chromosome are merged. Each site is
+    mapped to the key ``code * width + position``, so the intervals of all the
+    chromosomes are in one sorted array and one ``numpy.searchsorted`` finds the
+    interval of every site.
+
+    Parameters
+    ----------
+    codes, starts, ends : 1d array-like
+        The chromosome code, start and end of each interval.
+
+    width : number
+        Larger than all the positions, the intervals are clipped to [0, width).
+    """
+    def __init__(self, codes, starts, ends, width):
+        self.width = float(width)
+        codes = np.asarray(codes, dtype=np.float64)
+        lo = codes * self.width + np.clip(starts, 0, self.width - 1)
+        hi = codes * self.width + np.clip(ends, 0, self.width - 1)
+
+        order = np.argsort(lo, kind="stable")
+        lo, hi = lo[order], hi[order]
+        is_new = np.r_[True, lo[1:] > np.maximum.accumulate(hi)[:-1]] if len(lo) else np.empty(0, dtype=bool)
+        first = np.flatnonzero(is_new)
+        self.starts = lo[first]
+        self.ends = np.maximum.reduceat(hi, first) if len(first) else hi
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, codes, positions):
+        """The index of the merged interval which holds each site, -1 if none."""
+        key = np.asarray(codes, dtype=np.float64) * self.width + positions
+        i = np.searchsorted(self.starts, key, side="right") - 1
+        if len(self.starts) == 0:
+            return i
+
+        i[key > self.ends[np.maximum(i, 0)]] = -1
+        return i
+
+    def contains(self, codes, positions):
+        """A boolean mask of the sites which are in any of the intervals."""
+        return self.lookup(codes, positions) >= 0
@@ -0,0 +1,203 @@
+"""A prepared association dataset which is shared by the plots and the lambda.
+
+Copyright (c) Shujia Huang
+Date: 2026-10-18
+
+"""
+import numpy as np
+from pandas import DataFrame, CategoricalDtype, factorize
+
+from ..utils import check_numeric, check_pvalues
+
+
+class AssociationData(object):
+    """The association results prepared once for ``manhattanplot``, ``qqplot``
+    and ``genomic_inflation``.
+
+    The input is validated and the genome-wide coordinates are computed when
+    it's created, the -log10(P), the sorted P values and the significance masks
+    are computed when they are used for the first time and then kept, so each
+    of them is done only once for all the plots.
+
+    Parameters
+    ----------
+    data : DataFrame.
+        A DataFrame with columns "#CHROM," "POS," "P," and optionally, "SNP."
+
+    chrom : string, default is "#CHROM", optional
+        A string denoting the column name for chromosome.
+
+    pos : string, default is "POS", optional.
+        A string denoting the column name for chromosomal position.
+
+    pv : string, default is "P", optional.
+        A string denoting the column name for P values.
+
+    snp : string, or None, optional.
+        A string denoting the column name for the SNP IDs.
+
+    Attributes
+    ----------
+    data : DataFrame
+        The input ``data``, the chromosome ids are converted to strings.
+
+    order : 1d integer array or None
+        Row order of ``data`` which groups the sites by chromosome, None if
+        ``data`` is already grouped. All the arrays below are in this order.
+
+    codes : 1d integer array
+        Chromosome code (index into ``chrom_names``) of each site.
+
+    chrom_names : 1d array
+        The chromosome ids in the order of their first appearance.
+
+    x : 1d float array
+        The genome-wide x position of each site.
+
+    xticks : 1d float array
+        The middle position of each chromosome on the genome-wide x-axis.
+
+    p_value : 1d float array
+        The P value of each site, 0 is set to 1e-300.
+
+    n_zero : integer
+        The number of P values which are 0.
+
+    Examples
+    --------
+        >>> import pandas as pd
+        >>> from qmplot import AssociationData, manhattanplot, qqplot, genomic_inflation
+        >>> df = pd.read_table("tests/data/gwas_plink_result.tsv", sep="\\t")
+        >>> df = df.dropna(how="any", axis=0)
+        >>> dataset = AssociationData(df, chrom="#CHROM", pos="POS", pv="P", snp="ID")
+        >>> ax = manhattanplot(dataset)
+        >>> ax = qqplot(dataset)
+        >>> result = genomic_inflation(dataset, strata="chrom")
+    """
+    def __init__(self, data, chrom="#CHROM", pos="POS", pv="P", snp=None):
+        if not isinstance(data, DataFrame):
+            raise ValueError("[ERROR] Input data must be a pandas.DataFrame.")
+        for c in [chrom, pos, pv] + ([snp] if snp is not None else []):
+            if c not in data:
+                raise ValueError("[ERROR] Column \"%s\" not found!" % c)
+        if data.empty:
+            raise ValueError("[ERROR] Input data is empty.")
+
+        # make sure all the chromosome id are character.
+        if isinstance(data[chrom].dtype, CategoricalDtype):
+            data[chrom] = data[chrom].cat.rename_categories(lambda c: str(c))
+        else:
+            data[[chrom]] = data[[chrom]].astype(str)
+
+        check_numeric(data[pos], name=pos)
+        p_value = check_pvalues(data[pv], name=pv)
+
+        self.data = data
+        self.chrom, self.pos, self.pv, self.snp = chrom, pos, pv, snp
+        self.order, self.codes, self.chrom_names, self.x, self.xticks = _genome_coordinates(data[chrom],
+                                                                                            data[pos])
+        p_value = p_value[self.order] if self.order is not None else p_value.copy()
+        is_zero = p_value == 0
+        self.n_zero = int(is_zero.sum())
+        p_value[is_zero] = 1e-300  # set it to a very small value if p-value is 0.
+        self.p_value = p_value
+
+        self._logp = None
+        self._sorted_p = None
+        self._sorted_logp = None
+        self._significant = {}
+
+    def __len__(self):
+        return len(self.p_value)
+
+    @property
+    def logp(self):
+        """-log10(P) of each site."""
+        if self._logp is None:
+            self._logp = -np.log10(self.p_value)
+        return self._logp
+
+    @property
+    def sorted_p(self):
+        """The P values in ascending order."""
+        if self._sorted_p is None:
+            self._sorted_p = np.sort(self.p_value)
+        return self._sorted_p
+
+    @property
+    def sorted_logp(self):
+        """-log10(P) in descending order, the P values of 0 are inf."""
+        if self._sorted_logp is None:
+            if self._logp is None and self._sorted_p is not None:
+                self._sorted_logp = -np.log10(self._sorted_p)
+            else:
+                # -log10 is decreasing, reorder the cached ``logp`` instead of
+                # transforming all the P values again (in place, descending).
+                self._sorted_logp = np.negative(self.logp)
+                self._sorted_logp.sort()
+                np.negative(self._sorted_logp, out=self._sorted_logp)
+            self._sorted_logp[:self.n_zero] = np.inf
+        return self._sorted_logp
+
+    @property
+    def chrom_bounds(self):
+        """The first site of each chromosome and the number of sites at the end."""
+        return np.searchsorted(self.codes, np.arange(len(self.chrom_names) + 1))
+
+    def significant(self, threshold):
+        """A boolean mask of the sites with P <= ``threshold``."""
+        if threshold not in self._significant:
+            self._significant[threshold] = self.p_value <= threshold
+        return self._significant[threshold]
+
+
+def _genome_coordinates(chrom_ids, positions):
+    """Lay the chromosomes out one after another on a single genome-wide x-axis.
+
+    Chromosomes keep the order of their first appearance in ``chrom_ids`` and
+    every chromosome is shifted by the sum of the last positions of all the
+    chromosomes before it, so that they will not overlap in the plot.
+
+    Parameters
+    ----------
+    chrom_ids : 1d array-like
+        Chromosome id of each variant.
+
+    positions : 1d array-like
+        Chromosomal position of each variant.
+
+    Returns
+    -------
+    order : 1d integer array or None
+        Row order which groups the variants by chromosome, None if the input
+        is already grouped.
+
+    codes : 1d integer array
+        Chromosome code (index into ``chrom_names``) of every row in ``order``.
+
+    chrom_names : 1d array
+        The chromosome ids in plotting order.
+
+    x : 1d float array
+        The genome-wide x position of every row in ``order``.
+
+    xticks : 1d float array
+        The middle position of each chromosome on the x-axis.
+    """
+    codes, chrom_names = factorize(chrom_ids, sort=False)
+    positions = np.asarray(positions, dtype=float)
+
+    order = None
+    if np.any(codes[1:] < codes[:-1]):
+        order = np.argsort(codes, kind="stable")  # keep the raw order inside a chromosome
+        codes = codes[order]
+        positions = positions[order]
+
+    # first and last row of each chromosome
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    offsets = np.r_[0.0, np.cumsum(positions[ends])[:-1]]
+
+    x = positions + np.repeat(offsets, ends - starts + 1)
+    xticks = offsets + (positions[starts] + positions[ends]) / 2
+    return order, codes, np.asarray(chrom_names), x, xticks
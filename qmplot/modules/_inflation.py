@@ -0,0 +1,151 @@
+"""Functions for calculating the genomic inflation factor (lambda).
+
+Copyright (c) Shujia Huang
+Date: 2026-10-18
+
+"""
+import numpy as np
+from pandas import factorize
+from scipy.stats import chi2
+
+from ..utils import check_pvalues
+from ._dataset import AssociationData
+
+# The median of the chi-square distribution with 1 degree of freedom: 0.4549364
+_EXPECTED_MEDIAN = chi2.ppf(0.5, 1)
+
+
+def genomic_inflation(data, strata=None, n_cases=None, n_controls=None):
+    """Calculate the genomic inflation factor (lambda) of P values.
+
+    ``lambda_GC`` is the median of the 1-df chi-square statistics of the P
+    values divided by the expected median 0.4549364. The chi-square statistic
+    is a decreasing function of P, so the median is taken on the P values by
+    selection (``numpy.partition``) and only the median P values are converted
+    by ``chi2.isf``. No sorting and no chi-square array for all the P values
+    are needed, and it keeps the precision of tiny P values.
+
+    Parameters
+    ----------
+    data : list, 1d-array-like, Series or AssociationData
+        P values, the sorted P values of a prepared ``AssociationData`` are
+        reused.
+
+    strata : list, 1d-array-like, Series, "chrom" or None, optional
+        The label of stratum (e.g. the chromosome or the MAF bin) for each value
+        in ``data``, the lambda of each stratum will be calculated. For an
+        ``AssociationData``, "chrom" means the chromosomes, which are already
+        grouped, or the labels are for the rows of its ``data``.
+
+    n_cases, n_controls : integer or None, optional
+        The number of cases and controls, which are used for ``lambda_1000``,
+        the lambda rescaled to a study with 1000 cases and 1000 controls.
+
+    Returns
+    -------
+    result : dict
+        ``{"n": the number of P values, "lambda_gc": lambda, "lambda_1000": lambda_1000
+        or None, "strata": {label: {"n": ..., "lambda_gc": ..., "lambda_1000": ...}}}``,
+        ``"strata"`` is only in ``result`` if ``strata`` is provided and the labels
+        are in the order of their first appearance.
+
+    Notes
+    -----
+    lambda_1000 = 1 + (lambda_gc - 1) * (1/n_cases + 1/n_controls) / (1/1000 + 1/1000)
+
+    Examples
+    --------
+        >>> import pandas as pd
+        >>> from qmplot import genomic_inflation
+        >>> df = pd.read_table("tests/data/gwas_plink_result.tsv", sep="\\t")
+        >>> df = df.dropna(how="any", axis=0)
+        >>> result = genomic_inflation(df["P"], strata=df["#CHROM"])
+        >>> result["lambda_gc"], result["strata"]["chr8"]["lambda_gc"]
+    """
+    if (n_cases is None) != (n_controls is None):
+        raise ValueError("[ERROR] ``n_cases`` and ``n_controls`` must be set simultaneously.")
+
+    if isinstance(data, AssociationData):
+        result = _dataset_inflation(data, n_cases, n_controls)
+        if strata is None:
+            return result
+
+        p_value = data.p_value
+        if isinstance(strata, str) and strata == "chrom":
+            bounds = data.chrom_bounds
+            result["strata"] = {label: _inflation(p_value[bounds[i]:bounds[i + 1]], n_cases, n_controls)
+                                for i, label in enumerate(data.chrom_names)}
+            return result
+
+    else:
+        p_value = check_pvalues(data, name="data")
+        result = _inflation(p_value, n_cases, n_controls)
+        if strata is None:
+            return result
+
+    if len(strata) != len(p_value):
+        raise ValueError("[ERROR] Input `data` and `strata` must all be the same size.")
+
+    codes, labels = factorize(strata)
+    if (codes < 0).any():
+        raise ValueError("[ERROR] Found missing values in `strata`.")
+    if isinstance(data, AssociationData) and data.order is not None:
+        codes = codes[data.order]  # the labels are for the raw rows
+
+    # Group the P values by stratum with one stable (radix) sort of the codes.
+    codes = codes.astype(np.int16 if len(labels) < (1 << 15) else np.int64)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    p_value = p_value[order]
+
+    result["strata"] = {label: _inflation(p_value[bounds[i]:bounds[i + 1]], n_cases, n_controls)
+                        for i, label in enumerate(labels)}
+    return result
+
+
+def _dataset_inflation(data, n_cases=None, n_controls=None):
+    """``_inflation`` of all the sites of an ``AssociationData``.
+
+    The median is taken from the sorted P values or -log10(P) if either of them
+    is already there, otherwise by selection, which doesn't sort all the P
+    values just for the median.
+    """
+    n = len(data)
+    if n and data._sorted_p is not None:
+        median_p = data._sorted_p[_median_index(n)]
+    elif n and data._sorted_logp is not None:
+        # -log10 is decreasing, the rank of P is kept. The P values of 0 are 1e-300.
+        median_p = np.maximum(10.0 ** -data._sorted_logp[_median_index(n)], 1e-300)
+    else:
+        return _inflation(data.p_value, n_cases, n_controls)
+
+    return _lambda(median_p, n, n_cases, n_controls)
+
+
+def _inflation(p_value, n_cases=None, n_controls=None, is_sorted=False):
+    """The lambda_GC and lambda_1000 of the P values by selection, or directly
+    if the P values are sorted."""
+    n = len(p_value)
+    if n == 0:
+        return {"n": 0, "lambda_gc": np.nan, "lambda_1000": None}
+
+    kth = _median_index(n)
+    median_p = p_value[kth] if is_sorted else np.partition(p_value, kth)[kth]
+    return _lambda(median_p, n, n_cases, n_controls)
+
+
+def _median_index(n):
+    """The index of the middle one (two if ``n`` is even) of ``n`` sorted values."""
+    k = n // 2
+    return [k] if n % 2 else [k - 1, k]
+
+
+def _lambda(median_p, n, n_cases=None, n_controls=None):
+    """The lambda_GC and lambda_1000 of ``n`` (> 0) P values by the middle ones."""
+    # The median of chi-square values is the mean of the two middle ones if n is even.
+    lambda_gc = float(np.mean(chi2.isf(median_p, 1)) / _EXPECTED_MEDIAN)
+    lambda_1000 = None
+    if n_cases is not None:
+        lambda_1000 = 1 + (lambda_gc - 1) * (1.0 / n_cases + 1.0 / n_controls) / (2.0 / 1000)
+
+    return {"n": n, "lambda_gc": lambda_gc, "lambda_1000": lambda_1000}
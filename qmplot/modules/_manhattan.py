@@ -9,12 +9,17 @@ https://github.com/brentp/bio-playground/blob/master/plots/manhattan-plot.py
 Thanks for Brentp's contributions
 
 """
-from itertools import cycle
-from pandas import DataFrame
+from pandas import DataFrame, CategoricalDtype
 import numpy as np
 
+from scipy import ndimage
 import matplotlib.pyplot as plt
-from ..utils import adjust_text
+from matplotlib import rcParams
+from matplotlib.colors import to_rgba, to_rgba_array
+from ..utils import adjust_text, sweep_text, check_numeric, check_pvalues
+from ..utils._adjust_text import get_layout_renderer
+from ._clump import _clump_index, _IntervalIndex
+from ._dataset import AssociationData, _genome_coordinates
 
 
 # learn something from "https://github.com/reneshbedre/bioinfokit/blob/38fb4966827337f00421119a69259b92bb67a7d0/bioinfokit/visuz.py"
@@ -26,13 +31,17 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
                   sign_marker_p=None, sign_marker_color="r",
                   is_annotate_topsnp=False, highlight_other_SNPs_indcs=None,
                   highlight_other_SNPs_color="r", highlight_other_SNPs_kwargs=None,
-                  text_kws=None, ld_block_size=50000, **kwargs):
+                  text_kws=None, ld_block_size=50000, decimate=False, render="scatter", exact_p=1e-3,
+                  render_dpi=None, rasterized=False, max_labels=None, max_labels_per_chrom=None,
+                  label_min_spacing=None, label_placer="adjust", xlim=None, **kwargs):
     """Creates a manhattan plot from PLINK assoc output (or any data frame with chromosome, position, and p-value).
 
     Parameters
     ----------
-    data : DataFrame.
+    data : DataFrame, or AssociationData.
         A DataFrame with columns "#CHROM," "POS," "P," and optionally, "SNP."
+        Or a prepared ``AssociationData``, then its columns are used and ``chrom``,
+        ``pos`` and ``pv`` are ignored.
 
     chrom : string, default is "#CHROM", optional
         A string denoting the column name for chromosome. Defaults to be PLINK2.x's "#CHROM".
@@ -114,11 +123,22 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
     is_annotate_topsnp : boolean, default is False, optional.
         Annotate the top SNP or not for the significant locus.
 
-    highlight_other_SNPs_indcs : iterable, or None, optional
-        Numerical indices of other SNPs (i.e. not the top SNP) to highlight.
+    highlight_other_SNPs_indcs : iterable, dict, or None, optional
+        Other SNPs (i.e. not the top SNP) to highlight, could be:
 
-    highlight_other_SNPs_color : matplotlib color, default: "r", optional.
-        Define a color code for other highlighted SNP sites.
+        * Numerical indices of the SNPs in the plotting order, which is the
+          order of rows in ``data`` if the rows are grouped by chromosome.
+        * A boolean mask with the same length as ``data``.
+        * A collection of SNP IDs in the ``snp`` column.
+        * A dict of {group name: one of the above} for highlighting several
+          named groups, the group name is the label of its points in legend.
+
+        All the SNPs of a group are drawn by one ``ax.scatter()``.
+
+    highlight_other_SNPs_color : matplotlib color, or dict, default: "r", optional.
+        Define a color code for other highlighted SNP sites, or a dict of
+        {group name: color} for the groups in ``highlight_other_SNPs_indcs``,
+        the groups which are not in the dict are colored by the color cycle.
 
     highlight_other_SNPs_kwargs=None : Dict, or None, optional
         Dict of keyword arguments passed to the command highlighting the other SNPs.
@@ -129,6 +149,65 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
     ld_block_size : integer, default is 50000, optional
         Set the size of LD block which for finding top SNP. And the top SNP's annotation represent the block.
 
+    decimate : boolean, default is False, optional.
+        Only draw one representative point per color for each pixel of the output
+        image, except the points with p-value <= ``exact_p`` which are all drawn.
+        The image looks the same, but it's much faster to draw millions of points
+        and creates much smaller vector (PDF/SVG) files.
+
+    render : {"scatter", "density"}, default is "scatter", optional.
+        "density" aggregates all the points with p-value > ``exact_p`` into a pixel
+        grid in one vectorized pass and draws the grid as an image layer, the other
+        points are drawn as scatter on top of it. The time is linear and the extra
+        memory is bounded by the image size, use it for 100M+ variants.
+
+    exact_p : float, default is 1e-3, optional.
+        The points with p-value <= ``exact_p`` are always drawn exactly as scatter
+        when ``decimate=True`` or ``render="density"``.
+
+    render_dpi : float, or None, optional.
+        The resolution of the output image which is used to compute the pixel grid
+        for ``decimate`` and ``render="density"``, set it to the ``dpi`` of ``savefig``.
+        Default: None, use the dpi of the figure.
+
+    rasterized : boolean, default is False, optional.
+        Rasterize the dense point layers (all the points except the significant
+        sites marked by ``sign_marker_p``) at the ``dpi`` of ``savefig`` for vector
+        output (PDF/SVG), while the axes, lines, significant sites and texts are
+        kept as vector graphics. It makes the vector file much smaller.
+
+    max_labels : integer, or None, optional.
+        The largest number of top SNPs to annotate, the top SNPs with the smallest
+        p-values are kept. Default: None, no limit.
+
+    max_labels_per_chrom : integer, or None, optional.
+        The largest number of top SNPs to annotate in each chromosome.
+        Default: None, no limit.
+
+    label_min_spacing : float, or None, optional.
+        The smallest distance in points (1/72 inch) on the screen between two
+        annotated top SNPs, a top SNP which is too close to a kept one with a
+        smaller p-value is not annotated. Default: None, no limit.
+
+        The labels which lose in ``max_labels``, ``max_labels_per_chrom`` and
+        ``label_min_spacing`` are dropped before the texts are adjusted, and the
+        number of the dropped labels is reported.
+
+    label_placer : {"adjust", "sweep"}, default is "adjust", optional.
+        The engine for placing the annotations of top SNPs. "adjust" repels the
+        texts from each other and from the points iteratively by ``adjust_text``.
+        "sweep" places the texts in a few slots above the peaks by one sweep from
+        left to right with leader lines (``sweep_text``), which is fast and always
+        gives the same layout for the same input, the texts which have no free
+        place in the axes are dropped. ``text_kws`` are passed to the engine.
+
+    xlim : tuple, or None, optional.
+        The (left, right) limits of the x-axis, which are the chromosomal positions
+        when only one chromosome is plotted, e.g. for zooming into a region. The
+        pixel grid of ``decimate`` and ``render="density"`` and the annotations
+        of top SNPs are computed in this view, the points and top SNPs out of it
+        are skipped. Default: None, the whole x range of the data.
+
     kwargs : key, value pairings, optional
         Other keyword arguments are passed to ``plt.scatter()`` or
         ``plt.vlines()`` (in matplotlib.pyplot) depending on whether
@@ -222,6 +301,15 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
         ...               ax=ax)
         >>> plt.savefig("output_manhattan_plot.png", dpi=300)
     """
+    dataset = None  # the prepared coordinates and P values
+    if isinstance(data, AssociationData):
+        chrom, pos, pv = data.chrom, data.pos, data.pv
+        if CHR is None or (len(data.chrom_names) == 1 and data.chrom_names[0] == str(CHR)):
+            dataset = data
+
+        # Otherwise the sites of ``CHR`` are prepared again from the raw data.
+        data = data.data
+
     if not isinstance(data, DataFrame):
         raise ValueError("[ERROR] Input data must be a pandas.DataFrame.")
     if chrom not in data:
@@ -235,8 +323,15 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
                          "NO SNP \"%s\" column found!" % snp)
     if CHR is not None and xtick_label_set is not None:
         raise ValueError("[ERROR] ``CHR`` and ``xtick_label_set`` can't be set simultaneously.")
+    if label_placer not in ("adjust", "sweep"):
+        raise ValueError("[ERROR] ``label_placer`` must be one of \"adjust\" or \"sweep\".")
 
-    data[[chrom]] = data[[chrom]].astype(str)  # make sure all the chromosome id are character.
+    # make sure all the chromosome id are character, a prepared dataset has done it.
+    if dataset is None:
+        if isinstance(data[chrom].dtype, CategoricalDtype):
+            data[chrom] = data[chrom].cat.rename_categories(lambda c: str(c))
+        else:
+            data[[chrom]] = data[[chrom]].astype(str)
 
     # Draw the plot and return the Axes
     if ax is None:
@@ -252,88 +347,68 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
 
     if "," in color:
         color = color.split(",")
-    colors = cycle(color)
-
-    last_xpos = 0
-    xs_by_id = []  # use for collecting chromosome's position on x-axis
-    x, y, c = [], [], []
-    sign_snp_sites = []
-    for seqid, group_data in data.groupby(by=chrom, sort=False):  # keep the raw order of chromosome
-
-        if (CHR is not None) and (seqid != CHR):
-            continue
-
-        color = next(colors)
-        for i, (site, p_value) in enumerate(zip(group_data[pos], group_data[pv])):
-            if p_value == 0:
-                p_value = 1e-300  # set it to a very small value if p-value is 0.
 
-            y_value = -np.log10(p_value) if logp else p_value
-            x.append(last_xpos + site)
-            y.append(y_value)
-            c.append(sign_marker_color if ((sign_marker_p is not None) and (p_value <= sign_marker_p)) else color)
+    is_kept = None  # rows in the plot, for mapping a boolean mask of ``data``
+    if CHR is not None and dataset is None:
+        is_kept = (data[chrom] == CHR).to_numpy()
+        data = data[is_kept]
 
-            if (snp is not None) and (sign_marker_p is not None) and (p_value <= sign_marker_p):
-                snp_id = group_data[snp].iloc[i]
-                sign_snp_sites.append([last_xpos + site, y_value, snp_id])  # x_pos, y_value, text
-
-        # ``xs_by_id`` is for setting up positions and ticks. Ticks should
-        # be placed in the middle of a chromosome. The a new pos column is
-        # added that keeps a running sum of the positions of each successive
-        # chromsome.
-        xs_by_id.append([seqid, last_xpos + (group_data[pos].iloc[0] + group_data[pos].iloc[-1]) / 2])
-        last_xpos = x[-1]  # keep track so that chromosome will not overlap in the plot.
-
-    if not x:
+    if data.empty:
         raise ValueError("zero-size array to reduction operation minimum which has no "
                          "identity. This could be caused by zero-size array of ``x`` "
                          "in the ``manhattanplot(...)`` function.")
 
-    if "marker" not in kwargs:
-        kwargs["marker"] = marker
-
-    # plot the main manhattan dot plot
-    ax.scatter(x, y, c=c, alpha=alpha, edgecolors="none", **kwargs)
+    if dataset is not None:
+        order, codes, chrom_names, x, xticks = (dataset.order, dataset.codes, dataset.chrom_names,
+                                                dataset.x, dataset.xticks)
+        p_value = dataset.p_value
+        y = dataset.logp if logp else p_value
+    else:
+        check_numeric(data[pos], name=pos)
+        p_value = check_pvalues(data[pv], name=pv) if logp else check_numeric(data[pv], name=pv)
+
+        order, codes, chrom_names, x, xticks = _genome_coordinates(data[chrom], data[pos])
+        p_value = p_value[order] if order is not None else p_value.copy()
+        p_value[p_value == 0] = 1e-300  # set it to a very small value if p-value is 0.
+        y = -np.log10(p_value) if logp else p_value
+
+    # ``xs_by_id`` is for setting up positions and ticks. Ticks should be placed
+    # in the middle of a chromosome.
+    xs_by_id = list(zip(chrom_names, xticks))
+
+    # Chromosomes cycle through the colors of ``color`` and the significant
+    # sites are painted with ``sign_marker_color``, which is the last one in
+    # ``colors``. Each point only keeps the index of its color.
+    palette = to_rgba_array(list(color))
+    colors = np.vstack([palette, to_rgba(sign_marker_color)])
+    color_group = (codes % len(palette)).astype(np.int16)
+
+    sign_index = np.empty(0, dtype=np.int64)
+    if sign_marker_p is not None:
+        is_sign = dataset.significant(sign_marker_p) if dataset is not None else p_value <= sign_marker_p
+        color_group[is_sign] = len(palette)
+        sign_index = np.flatnonzero(is_sign)
 
     if is_annotate_topsnp:
-        index = _find_SNPs_which_overlap_sign_neighbour_region(
-            sign_snp_neighbour_region=_sign_snp_regions(sign_snp_sites, ld_block_size),
-            x=x)
-
-        # reset color for all SNPs which nearby the top SNPs.
-        xs, ys = [], []
-        for i in index:
-            xs.append(x[i])
-            ys.append(y[i])
-
-        ax.scatter(xs, ys, c=sign_marker_color, alpha=alpha, edgecolors="none", **kwargs)
+        # Clump the significant sites of each chromosome into blocks, ``x`` keeps
+        # the distance between the sites in the same chromosome.
+        lead, block_start, block_end, _ = _clump_index(codes[sign_index], x[sign_index],
+                                                       p_value[sign_index], ld_block_size)
+        lead = sign_index[lead]
 
-    highlight_other_SNPs_kwargs = dict() if highlight_other_SNPs_kwargs is \
-                                            None else highlight_other_SNPs_kwargs
-
-    # highlight other SNPs
-    if highlight_other_SNPs_indcs is not None:
-        for i in highlight_other_SNPs_indcs:
-            ax.scatter(x[i], y[i], c=highlight_other_SNPs_color,
-                       alpha=alpha, edgecolors="none", **highlight_other_SNPs_kwargs)
-
-    # Add GWAS significant lines
-    if "color" in hline_kws:
-        hline_kws.pop("color")
+        # Index the neighbour regions of the blocks once, for looking up all the
+        # sites of the highlight layers.
+        neighbour_index = _IntervalIndex(codes[lead], block_start - ld_block_size,
+                                         block_end + ld_block_size, width=x.max() + 1)
 
-    sign_line_cols = sign_line_cols.split(",") if "," in sign_line_cols else sign_line_cols
-    if suggestiveline is not None:
-        ax.axhline(y=-np.log10(suggestiveline) if logp else suggestiveline, color=sign_line_cols[0], **hline_kws)
-    if genomewideline is not None:
-        ax.axhline(y=-np.log10(genomewideline) if logp else genomewideline, color=sign_line_cols[1], **hline_kws)
+    if "marker" not in kwargs:
+        kwargs["marker"] = marker
 
-    # Plotting the top SNP for each significant block
-    if is_annotate_topsnp:
-        sign_top_snp = _find_top_snp(sign_snp_sites, ld_block_size=ld_block_size, is_get_biggest=logp)
-        if sign_top_snp:  # not empty
-            texts = [ax.text(_x, _y, _text) for _x, _y, _text in sign_top_snp]
-            adjust_text(texts, ax=ax, **text_kws)
+    xlim = (0, x[-1]) if xlim is None else tuple(xlim)
+    ylim = (y.min(), 1.2 * y.max())
 
+    # Set up the axes before drawing, so that the layout engine of the figure
+    # gives the final size of the axes for ``decimate`` and ``render="density"``.
     if CHR is None:
 
         if xtick_label_set is not None:
@@ -348,8 +423,8 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
         # if you are just interesting in this chromosome.
         ax.get_xaxis().get_major_formatter().set_scientific(False)
 
-    ax.set_xlim(0, x[-1])
-    ax.set_ylim(ymin=min(y), ymax=1.2 * max(y))
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
 
     if title:
         ax.set_title(title)
@@ -360,76 +435,266 @@ def manhattanplot(data, chrom="#CHROM", pos="POS", pv="P", snp="ID", logp=True,
 
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
-    return ax
 
+    near_index = None
+    if is_annotate_topsnp:
+        # all SNPs which nearby the top SNPs, they will be reset to ``sign_marker_color``.
+        near_index = np.flatnonzero(neighbour_index.contains(codes, x))
 
-def _find_top_snp(sign_snp_data, ld_block_size, is_get_biggest=True):
-    """
-    :param sign_snp_data:  A 2D array: [[xpos1, yvalue1, text1], [xpos2, yvalue2, text2], ...]
-    """
-    top_snp = []
-    tmp_cube = []
-    for i, (_x, _y, text) in enumerate(sign_snp_data):
-        if i == 0:
-            tmp_cube.append([_x, _y, text])
-            continue
+    # plot the main manhattan dot plot
+    index = slice(None)  # all the points
+    if render == "density" or decimate:
+        is_exact = dataset.significant(exact_p) if dataset is not None else p_value <= exact_p
+        shape = _axes_pixel_size(ax, render_dpi)
+
+    if render == "density":
+        # Only the points with p-value <= ``exact_p`` are drawn as scatter.
+        group = color_group.copy()
+        if near_index is not None:
+            group[near_index] = len(palette)
+            near_index = near_index[is_exact[near_index]]
+        group[is_exact] = -1
+
+        _draw_density(ax, x, y, group, colors, alpha, xlim, ylim, shape,
+                      radius=_marker_pixel_radius(ax, render_dpi, kwargs.get("s"), kwargs["marker"]))
+        index = np.flatnonzero(is_exact)
+
+    elif render != "scatter":
+        raise ValueError("[ERROR] ``render`` must be one of \"scatter\" or \"density\".")
+
+    elif decimate:
+        index = _decimate_index(x, y, color_group, is_exact,
+                                xlim, ylim, shape)
+
+    if rasterized and sign_marker_p is not None:
+        # Draw the significant sites on top as vector graphics.
+        index = np.arange(len(x))[index]
+        dense_index, vector_index = index[~is_sign[index]], index[is_sign[index]]
+        ax.scatter(x[dense_index], y[dense_index], c=colors[color_group[dense_index]], alpha=alpha,
+                   edgecolors="none", rasterized=True, **kwargs)
+        ax.scatter(x[vector_index], y[vector_index], c=colors[color_group[vector_index]], alpha=alpha,
+                   edgecolors="none", **kwargs)
+    else:
+        ax.scatter(x[index], y[index], c=colors[color_group[index]], alpha=alpha, edgecolors="none",
+                   rasterized=rasterized, **kwargs)
 
-        if _x > tmp_cube[-1][0] + ld_block_size:
-            # Sorted by y_value in increase/decrease order and only get the first value [0], which is the TopSNP.
-            top_snp.append(sorted(tmp_cube, key=(lambda x: x[1]), reverse=is_get_biggest)[0])
-            tmp_cube = []
+    if near_index is not None:
+        if decimate and render == "scatter":
+            near_index = near_index[_decimate_index(x[near_index], y[near_index],
+                                                    np.zeros(len(near_index), dtype=int),
+                                                    p_value[near_index] <= exact_p,
+                                                    xlim, ylim, shape)]
 
-        tmp_cube.append([_x, _y, text])
+        # reset color for all SNPs which nearby the top SNPs.
+        ax.scatter(x[near_index], y[near_index], c=sign_marker_color, alpha=alpha, edgecolors="none",
+                   rasterized=rasterized, **kwargs)
 
-    if tmp_cube:  # deal the last one
-        top_snp.append(sorted(tmp_cube, key=(lambda x: x[1]), reverse=True)[0])
+    highlight_other_SNPs_kwargs = dict() if highlight_other_SNPs_kwargs is \
+                                            None else highlight_other_SNPs_kwargs
 
-    return top_snp
+    # highlight other SNPs, one collection for each group
+    if highlight_other_SNPs_indcs is not None:
+        groups = highlight_other_SNPs_indcs if isinstance(highlight_other_SNPs_indcs, dict) else \
+            {None: highlight_other_SNPs_indcs}
+        for i, (name, selection) in enumerate(groups.items()):
+            if isinstance(highlight_other_SNPs_color, dict):
+                group_color = highlight_other_SNPs_color.get(name, "C%d" % (i % 10))
+            else:
+                group_color = highlight_other_SNPs_color
+
+            index = _highlight_index(selection, data, snp, order, is_kept)
+            ax.scatter(x[index], y[index], c=group_color, alpha=alpha, edgecolors="none",
+                       label=name, **highlight_other_SNPs_kwargs)
 
+    # Add GWAS significant lines
+    if "color" in hline_kws:
+        hline_kws.pop("color")
 
-def _sign_snp_regions(sign_snp_data, ld_block_size):
-    """Create region according to the coordinate of sign_snp_data."""
-    regions = []
-    for i, (_x, _y, _t) in enumerate(sign_snp_data):
-        if i == 0:
-            regions.append([_x - ld_block_size, _x])
-            continue
+    sign_line_cols = sign_line_cols.split(",") if "," in sign_line_cols else sign_line_cols
+    if suggestiveline is not None:
+        ax.axhline(y=-np.log10(suggestiveline) if logp else suggestiveline, color=sign_line_cols[0], **hline_kws)
+    if genomewideline is not None:
+        ax.axhline(y=-np.log10(genomewideline) if logp else genomewideline, color=sign_line_cols[1], **hline_kws)
 
-        if _x > regions[-1][1] + ld_block_size:
-            regions[-1][1] += ld_block_size
-            regions.append([_x - ld_block_size, _x])
-        else:
-            regions[-1][1] = _x
+    # Plotting the top SNP for each significant block, after the axes limits
+    # and labels are final so that the texts are placed in the final layout.
+    if is_annotate_topsnp:
+        lead = lead[(x[lead] >= xlim[0]) & (x[lead] <= xlim[1])]  # the top SNPs in view
+    if is_annotate_topsnp and len(lead):
+        lead = _label_budget(ax, lead, codes, x, y, max_labels=max_labels,
+                             max_labels_per_chrom=max_labels_per_chrom,
+                             min_spacing=label_min_spacing)
+        snp_ids = data[snp].to_numpy()[order[lead] if order is not None else lead]
+        texts = [ax.text(_x, _y, _text) for _x, _y, _text in zip(x[lead], y[lead], snp_ids)]
+        if texts:
+            placer = sweep_text if label_placer == "sweep" else adjust_text
+            placer(texts, ax=ax, **text_kws)
 
-    # The last
-    if regions:
-        regions[-1][1] += ld_block_size
+    return ax
 
-    return regions
 
+def _highlight_index(selection, data, snp, order, is_kept=None):
+    """The indices of the SNPs in ``selection`` in the plotting order.
 
-def _find_SNPs_which_overlap_sign_neighbour_region(sign_snp_neighbour_region, x):
+    ``selection`` could be numerical indices in the plotting order, a boolean
+    mask of the raw rows of ``data`` (before the rows are filtered by
+    ``is_kept``), or a collection of SNP IDs in column ``snp``.
     """
+    if isinstance(selection, (set, frozenset)):
+        selection = list(selection)
+
+    values = np.asarray(selection)
+    if values.dtype.kind == "b":
+        n_raw = len(is_kept) if is_kept is not None else len(data)
+        if len(values) != n_raw:
+            raise ValueError("[ERROR] The boolean mask for highlighting must have the same "
+                             "length as ``data``: %d != %d." % (len(values), n_raw))
+        is_highlight = values[is_kept] if is_kept is not None else values
+
+    elif values.dtype.kind in "iu":
+        return values
+
+    elif len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    else:
+        if snp is None or snp not in data:
+            raise ValueError("[ERROR] You're trying to highlight a set of SNP IDs but "
+                             "NO SNP \"%s\" column found!" % snp)
+        is_highlight = data[snp].isin(values).to_numpy()
+
+    return np.flatnonzero(is_highlight[order] if order is not None else is_highlight)
+
+
+def _label_budget(ax, lead, codes, x, y, max_labels=None, max_labels_per_chrom=None,
+                  min_spacing=None):
+    """Cull the top SNPs in ``lead`` to the label budget.
+
+    The top SNPs are taken greedily from the largest ``y`` (-log10(P)), a top
+    SNP is dropped if the total or its chromosome is already full, or it is
+    closer than ``min_spacing`` points on the screen to a kept one. The kept
+    top SNPs are returned in their original order.
     """
-    x_size = len(x)
-    reg_size = len(sign_snp_neighbour_region)
-    index = []
-    tmp_index = 0
-    for i in range(x_size):
-        _x = x[i]
-
-        is_overlap = False
-        iter_index = range(tmp_index, reg_size)
-        for j in iter_index:
-            if _x > sign_snp_neighbour_region[j][1]: continue
-            if _x < sign_snp_neighbour_region[j][0]: break
-
-            tmp_index = j
-            is_overlap = True
+    if max_labels is None and max_labels_per_chrom is None and min_spacing is None:
+        return lead
+
+    priority = lead[np.argsort(-y[lead], kind="stable")]
+    if min_spacing is not None:
+        get_layout_renderer(ax)  # measure in the final layout of the figure
+        xy = ax.transData.transform(np.column_stack([x[priority], y[priority]]))
+        min_spacing = min_spacing * ax.get_figure().dpi / 72.0  # points to pixels
+
+    n_max = len(lead) if max_labels is None else max_labels
+    n_chrom = np.zeros(codes.max() + 1, dtype=np.int64)
+    is_kept = np.zeros(len(priority), dtype=bool)
+    n_kept = 0
+    for i, k in enumerate(priority):
+        if n_kept >= n_max:
             break
+        if max_labels_per_chrom is not None and n_chrom[codes[k]] >= max_labels_per_chrom:
+            continue
+        if min_spacing is not None and n_kept and \
+                np.hypot(*(xy[is_kept] - xy[i]).T).min() < min_spacing:
+            continue
 
-        if is_overlap:
-            index.append(i)
+        is_kept[i] = True
+        n_kept += 1
+        n_chrom[codes[k]] += 1
 
-    # return the index
-    return index
+    n_drop = len(lead) - n_kept
+    if n_drop:
+        print("[WARNING] %d of %d top SNP labels are dropped by the label budget." % (n_drop, len(lead)))
+    return np.sort(priority[is_kept])
+
+
+def _axes_pixel_size(ax, dpi=None):
+    """The (width, height) of ``ax`` in pixels in an output image of ``dpi``.
+
+    The layout engine of the figure (e.g. ``constrained_layout``) is run first,
+    so it's the size of the axes in the saved image, not the one before layout.
+    """
+    fig = ax.get_figure()
+    get_layout_renderer(ax)
+    scale = 1.0 if dpi is None else dpi / fig.dpi
+    bbox = ax.get_window_extent()
+    return max(1, int(round(bbox.width * scale))), max(1, int(round(bbox.height * scale)))
+
+
+def _marker_pixel_radius(ax, dpi=None, s=None, marker="o"):
+    """The radius in pixels of a scatter marker with size ``s`` (points ** 2)."""
+    dpi = ax.get_figure().dpi if dpi is None else dpi
+    s = rcParams["lines.markersize"] ** 2 if s is None else s
+    scale = {".": 0.5, ",": 0.0}.get(marker, 1.0)  # "." is a half-size circle, "," is a pixel
+    return np.sqrt(s) * scale / 2 * dpi / 72
+
+
+def _pixel_index(x, y, xlim, ylim, shape):
+    """The flat index of the pixel of each point in a ``shape=(width, height)``
+    grid which covers ``xlim`` and ``ylim``, the row 0 is at the bottom."""
+    width, height = shape
+    ix = np.floor((x - xlim[0]) * (width / max(xlim[1] - xlim[0], 1e-300))).astype(np.int64)
+    iy = np.floor((y - ylim[0]) * (height / max(ylim[1] - ylim[0], 1e-300))).astype(np.int64)
+    np.clip(ix, 0, width - 1, out=ix)
+    np.clip(iy, 0, height - 1, out=iy)
+    return iy * width + ix
+
+
+def _decimate_index(x, y, group, is_keep, xlim, ylim, shape):
+    """Indices of the points to draw: every point with ``is_keep`` and the first
+    point of each ``group`` in each pixel of a ``shape=(width, height)`` grid
+    which covers ``xlim`` and ``ylim``, the other points out of ``xlim`` are
+    not drawn.
+
+    Returns
+    -------
+    index : 1d integer array, in increasing order to keep the raw drawing order.
+    """
+    n_group = int(group.max()) + 1 if len(group) else 1
+    rest = np.flatnonzero(~is_keep & (x >= xlim[0]) & (x <= xlim[1]))  # skip the points out of view
+    pixel_key = _pixel_index(x[rest], y[rest], xlim, ylim, shape) * n_group + group[rest]
+    _, first = np.unique(pixel_key, return_index=True)
+
+    is_draw = is_keep.copy()
+    is_draw[rest[first]] = True
+    return np.flatnonzero(is_draw)
+
+
+def _draw_density(ax, x, y, group, colors, alpha, xlim, ylim, shape, radius=0.0, chunksize=1 << 20):
+    """Aggregate the points into a count grid and a max grid of pixels and draw
+    them as an image layer.
+
+    Every pixel takes the color of the largest ``group`` of the points in it (the
+    points with ``group < 0`` or out of ``xlim`` are skipped) and the opacity of ``count`` stacked
+    markers. Both grids are dilated by ``radius`` pixels to get the size of the
+    markers. The points are processed in blocks of ``chunksize``, so the extra
+    memory is bounded by the size of the grids. ``shape`` is expected to be the
+    size of ``ax`` after layout (see ``_axes_pixel_size``), then every grid cell
+    is one pixel of the saved image and the image is not resampled.
+    """
+    width, height = shape
+    group_grid = np.full(width * height, -1, dtype=np.int16)
+    count_grid = np.zeros(width * height, dtype=np.int64)
+    for i in range(0, len(x), chunksize):
+        g = group[i:i + chunksize]
+        is_in = (g >= 0) & (x[i:i + chunksize] >= xlim[0]) & (x[i:i + chunksize] <= xlim[1])
+        pixel = _pixel_index(x[i:i + chunksize][is_in], y[i:i + chunksize][is_in], xlim, ylim, shape)
+        np.maximum.at(group_grid, pixel, g[is_in])
+        count_grid += np.bincount(pixel, minlength=width * height)
+
+    group_grid = group_grid.reshape(height, width)
+    count_grid = count_grid.reshape(height, width)
+    if radius >= 1:
+        r = int(np.ceil(radius))
+        yy, xx = np.ogrid[-r:r + 1, -r:r + 1]
+        footprint = xx ** 2 + yy ** 2 <= radius ** 2
+        group_grid = ndimage.grey_dilation(group_grid, footprint=footprint)
+        count_grid = ndimage.grey_dilation(count_grid, footprint=footprint)
+
+    image = np.zeros((height, width, 4))
+    is_filled = group_grid >= 0
+    image[is_filled] = colors[group_grid[is_filled]]
+    image[is_filled, 3] = 1 - (1 - alpha) ** np.minimum(count_grid[is_filled], 64)
+
+    ax.imshow(image, extent=(xlim[0], xlim[1], ylim[0], ylim[1]), origin="lower", aspect="auto",
+              interpolation="nearest")
+    return ax
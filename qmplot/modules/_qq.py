@@ -5,10 +5,12 @@ Date: 2021-02-21
 
 """
 import numpy as np
-from scipy.stats import norm, chi2
+from scipy.stats import norm
 import matplotlib.pyplot as plt
 
-from ..utils import is_numeric
+from ..utils import check_numeric, check_pvalues
+from ._inflation import _inflation, _dataset_inflation
+from ._dataset import AssociationData
 
 
 def ppoints(n, a=0.5):
@@ -60,14 +62,16 @@ def ppoints(n, a=0.5):
 
 
 def qqplot(data, other=None, logp=True, ax=None, marker="o", color=None, alpha=0.8, 
-           title=None, xlabel=None, ylabel=None, ablinecolor="r", **kwargs):
+           title=None, xlabel=None, ylabel=None, ablinecolor="r", rasterized=False, thin=False,
+           thin_top=10000, thin_bins=2000, method="sort", **kwargs):
     """Creat Q-Q plot.
     **CAUSION: The x-axis(expected) is created from uniform distribution.**
 
     Parameters
     ----------
-    data : list, 1d-array-like, or Series
-        Data (P value) to be plotted 
+    data : list, 1d-array-like, Series or AssociationData
+        Data (P value) to be plotted, the sorted P values of a prepared
+        ``AssociationData`` are reused.
 
     other : list, 1d-array-like, Series or None, optional
         If provided, the sample quantiles of the `data` array-like object are 
@@ -104,6 +108,31 @@ def qqplot(data, other=None, logp=True, ax=None, marker="o", color=None, alpha=0
         Color for the abline in plot. if set ``ablinecolor=None`` 
         means do not plot the abline.
 
+    rasterized : boolean, default is False, optional
+        Rasterize the points at the ``dpi`` of ``savefig`` for vector output
+        (PDF/SVG), while the axes, abline and texts are kept as vector graphics.
+
+    thin : boolean, default is False, optional
+        Only draw the ``thin_top`` smallest values exactly, the rest of the
+        points are binned into ``thin_bins`` bins along the expected axis and only
+        the first and the last point of each bin are drawn. The curve looks the
+        same but the number of points is independent of the size of ``data``.
+
+    thin_top : integer, default is 10000, optional
+        The number of the smallest values (the upper tail in -log10 scale) to
+        keep exactly if ``thin=True``.
+
+    thin_bins : integer, default is 2000, optional
+        The number of bins for the rest of points if ``thin=True``.
+
+    method : {"sort", "histogram"}, default is "sort", optional
+        How to compute the quantiles. "sort" sorts all the values. "histogram" is
+        for a very large ``data`` of P values (``other=None`` and ``logp=True``):
+        the ``thin_top`` smallest P values are taken by ``numpy.partition`` and
+        the rest of the curve is read from a histogram of -log10(P) with
+        ``thin_bins`` bins, which is O(n) in time and O(thin_top + thin_bins) in
+        extra memory. The curve is the same as "sort" within one bin width.
+
     kwargs : key, value pairings, optional
         Other keyword arguments are passed to ``plt.scatter()``
         (in matplotlib.pyplot).
@@ -168,41 +197,65 @@ def qqplot(data, other=None, logp=True, ax=None, marker="o", color=None, alpha=0
         >>> qqplot(data=data1, other=data2, logp=False,
         ...        xlabel="Expected", ylabel="Observe")
     """
-    if not all(map(is_numeric, data)):
-        msg = 'Input must all be numeric in `data`.'
-        raise ValueError(msg)
-
-    if other is not None and not all(map(is_numeric, other)):
-        msg = 'Input must all be numeric in `other`.'
-        raise ValueError(msg)
+    dataset = None
+    if isinstance(data, AssociationData):
+        if other is not None:
+            raise ValueError("[ERROR] ``other`` can't be used with an AssociationData.")
+        dataset = data
+        data = dataset.p_value
+
+    elif other is None:
+        # ``data`` is compared with the uniform distribution, so it must be P values
+        data = check_pvalues(data, name="data")
+    else:
+        data = check_numeric(data, name="data")
+        other = check_numeric(other, name="other")
 
     if other is not None and len(other) != len(data):
         msg = 'Input `data` and `other` must all be the same size.'
         raise ValueError(msg)
 
+    if method not in ("sort", "histogram"):
+        raise ValueError("[ERROR] ``method`` must be one of \"sort\" or \"histogram\".")
+    if method == "histogram" and (other is not None or not logp):
+        raise ValueError("[ERROR] ``method=\"histogram\"`` only works for P values "
+                         "(``other=None`` and ``logp=True``).")
+
     if xlabel is None:
         xlabel = r"$Expected(-log_{10}{(P)})$" if other is None else r"$-log_{10}{(Value)} of 2nd Sample$"
     if ylabel is None:
         ylabel = r"$Observed(-log_{10}{(P)})$" if other is None else r"(-log_{10}{(Value)}) of 1st Sample$"
 
-    data = np.array(data, dtype=float)
-
     # create observed and expected
-    e = ppoints(len(data)) if other is None else sorted(other)
-
-    if logp:
-        o = -np.log10(sorted(data))
-        e = -np.log10(e)
+    if method == "histogram":
+        e, o = _histogram_quantiles(data, thin_top, thin_bins)
+        if dataset is not None:
+            o[:min(dataset.n_zero, len(o))] = np.inf  # the P values of 0 are 1e-300 in dataset
+    elif dataset is not None:
+        o = dataset.sorted_logp if logp else dataset.sorted_p
+        e = -np.log10(ppoints(len(data))) if logp else ppoints(len(data))
+    elif logp:
+        o = -np.log10(np.sort(data))
+        e = -np.log10(ppoints(len(data)) if other is None else np.sort(other))
     else:
-        o = np.array(sorted(data))
-        e = np.array(e)
+        o = np.sort(data)
+        e = ppoints(len(data)) if other is None else np.sort(other)
+
+    if thin and method == "sort":
+        # The values are sorted, rank ``i`` is always at ``e[i]`` and ``o[i]``
+        keep = _thin_index(e, thin_top, thin_bins)
+        e, o = e[keep], o[keep]
 
     if "marker" not in kwargs:
         kwargs["marker"] = marker
+    if rasterized:
+        kwargs["rasterized"] = True
     ax = _do_plot(e, o, ax=ax, color=color, ablinecolor=ablinecolor, alpha=alpha, **kwargs)
 
-    expected_median = chi2.ppf(0.5, 1)  # This value is equal to 0.4549364
-    lambda_value = round(np.median(norm.ppf(1-data/2) ** 2) / expected_median, 3)  # data/2 => Two side test
+    if dataset is not None:
+        lambda_value = round(_dataset_inflation(dataset)["lambda_gc"], 3)
+    else:
+        lambda_value = round(_inflation(data)["lambda_gc"], 3)
 
     if title:
         title += r"$(\lambda = %s)$" % lambda_value
@@ -293,12 +346,8 @@ def qqnorm(data, ax=None, xlabel="Expected normal distribution", ylabel="Observe
         ...        xlabel="Expected value",
         ...        ylabel="Observed value")
     """
-    if not all(map(is_numeric, data)):
-        msg = 'Input must all be numeric in `data`.'
-        raise ValueError(msg)
-
     # Normalization the data to be in (mu=0.0, std=1.0) normal distribution
-    obs = np.array(data, dtype=float)
+    obs = check_numeric(data, name="data").copy()
     obs = (obs - obs.mean()) / obs.std()
     obs.sort()
 
@@ -314,6 +363,80 @@ def qqnorm(data, ax=None, xlabel="Expected normal distribution", ylabel="Observe
     return ax
 
 
+def _histogram_quantiles(data, top, bins, a=0.5, chunksize=1 << 20):
+    """The expected and observed -log10(P) of the QQ curve without sorting ``data``.
+
+    The ``top`` smallest P values are kept exactly. The rest of the curve is
+    sampled at the lower edge of each non-empty bin of the histogram of -log10(P)
+    between the largest P and the ``top``-th smallest one: the number of values
+    up to a bin is the rank, and the rank gives the expected value by ``ppoints``.
+    ``data`` is read in blocks of ``chunksize``.
+    """
+    n = len(data)
+    k = min(top, n)
+
+    # 1st pass: the ``k`` smallest values and the largest one.
+    tail, max_p = np.empty(0), 0.0
+    for i in range(0, n, chunksize):
+        block = data[i:i + chunksize]
+        tail = np.concatenate([tail, block])
+        if len(tail) > k:
+            tail = np.partition(tail, k - 1)[:k]
+        max_p = max(max_p, block.max())
+
+    tail.sort()
+    e = -np.log10((np.arange(k, dtype=float) + 1 - a) / (n + 1 - 2 * a))
+    o = -np.log10(tail)
+    if k == n:
+        return e, o
+
+    # 2nd pass: the histogram of -log10(P) for the values in [lo, hi).
+    lo, hi = -np.log10(max_p), -np.log10(tail[-1])
+    if hi <= lo:
+        # All the other values are equal to the largest one
+        return np.r_[e, -np.log10((n - a) / (n + 1 - 2 * a))], np.r_[o, lo]
+
+    scale = bins / (hi - lo)
+    counts = np.zeros(bins, dtype=np.int64)
+    for i in range(0, n, chunksize):
+        y = -np.log10(data[i:i + chunksize])
+        y = y[y < hi]
+        counts += np.bincount(np.minimum(((y - lo) * scale).astype(np.int64), bins - 1), minlength=bins)
+
+    # ``rank[j]``: the number of values with -log10(P) >= the lower edge of bin j.
+    rank = (n - counts.sum()) + np.cumsum(counts[::-1])[::-1]
+    is_filled = counts > 0
+    edges = lo + np.arange(bins) / scale
+    bulk_e = -np.log10((rank[is_filled] - a) / (n + 1 - 2 * a))
+    bulk_o = edges[is_filled]
+
+    return np.r_[e, bulk_e[::-1]], np.r_[o, bulk_o[::-1]]
+
+
+def _thin_index(e, top, bins):
+    """The indices of the points to keep in the sorted expected values ``e``.
+
+    The first ``top`` points are all kept, the others are binned into ``bins``
+    bins with the same width along ``e`` and the first and the last point of
+    each bin are kept.
+    """
+    n = len(e)
+    if n <= top + 2 * bins:
+        return np.arange(n)
+
+    bulk = e[top:]
+    lo, hi = min(bulk[0], bulk[-1]), max(bulk[0], bulk[-1])
+    if lo == hi:
+        return np.r_[np.arange(top), n - 1]
+
+    bin_id = np.minimum(((bulk - lo) * (bins / (hi - lo))).astype(np.int64), bins - 1)
+    is_edge = np.r_[True, bin_id[1:] != bin_id[:-1]]
+    is_edge[:-1] |= is_edge[1:]  # the last point of each bin
+    is_edge[-1] = True
+
+    return np.r_[np.arange(top), top + np.flatnonzero(is_edge)]
+
+
 def _do_plot(x, y, ax=None, color=None, ablinecolor="r", alpha=0.8, **kwargs):
     """
     Boiler plate plotting function for the `qqplot` and `qqnorm`
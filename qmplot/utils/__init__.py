@@ -7,13 +7,26 @@ qqman, as well as various utility functionality, including plotting and
 unit-testing convenience functions.
 
 """
-from ._misc import chr_id_cmp, is_numeric, is_integer, iqr, freedman_diaconis_bins
-from ._adjust_text import adjust_text
+from ._misc import chr_id_cmp, is_numeric, is_integer, check_numeric, check_pvalues, iqr, \
+    freedman_diaconis_bins
+from ._adjust_text import adjust_text, AdjustTextTelemetry
+from ._sweep_text import sweep_text
+from ._io import read_sumstats, read_sumstats_regions
+from ._cache import SumstatsCache
+from ._tabix import parse_region
 
 __all__ = ["chr_id_cmp",
            "is_numeric",
            "is_integer",
+           "check_numeric",
+           "check_pvalues",
            "iqr",
            "freedman_diaconis_bins",
-           "adjust_text"]
+           "adjust_text",
+           "AdjustTextTelemetry",
+           "sweep_text",
+           "read_sumstats",
+           "read_sumstats_regions",
+           "SumstatsCache",
+           "parse_region"]
 
@@ -6,7 +6,7 @@ Modify by Shujia Huang
 Date: 2021-02-05 18:39:32
 """
 from itertools import product
-from operator import itemgetter
+import time
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -125,6 +125,72 @@ def get_points_inside_bbox(x, y, bbox):
     return np.asarray(np.where(x_in & y_in)[0])
 
 
+class PointGrid(object):
+    """A uniform grid index of points in display coordinates for finding the
+    points inside bboxes.
+
+    The points are sorted by their grid cell, so the points of the cells in one
+    column of a query bbox are in one contiguous slice. The cost of a query
+    scales with the number of points around the bbox, not the total.
+
+    Parameters
+    ----------
+    x, y : 1d array-like
+        The coordinates of points.
+
+    cell_size : (float, float), or None
+        The (width, height) of a cell, better to be about the size of the
+        bboxes to query. Default: the extent of points divided by sqrt(n).
+    """
+    def __init__(self, x, y, cell_size=None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        index = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+
+        self.x0 = self.x[index].min() if len(index) else 0.0
+        self.y0 = self.y[index].min() if len(index) else 0.0
+        if cell_size is None:
+            n = max(np.sqrt(len(index)), 1.0)
+            cell_size = (np.ptp(self.x[index]) / n if len(index) else 1.0,
+                         np.ptp(self.y[index]) / n if len(index) else 1.0)
+        self.cw, self.ch = [c if c > 0 else 1.0 for c in cell_size]
+
+        gx = ((self.x[index] - self.x0) // self.cw).astype(np.int64)
+        gy = ((self.y[index] - self.y0) // self.ch).astype(np.int64)
+        self.nx = gx.max() + 1 if len(index) else 0
+        self.ny = gy.max() + 1 if len(index) else 0
+
+        key = gx * self.ny + gy
+        order = np.argsort(key, kind="stable")
+        self.keys = key[order]
+        self.index = index[order]
+
+    def __len__(self):
+        return len(self.index)
+
+    def inside(self, bbox):
+        """The sorted indices of the points strictly inside ``bbox``."""
+        return self.inside_extents(bbox.xmin, bbox.ymin, bbox.xmax, bbox.ymax)
+
+    def inside_extents(self, x1, y1, x2, y2):
+        """The sorted indices of the points strictly inside (x1, y1, x2, y2)."""
+        gx1 = max(int((x1 - self.x0) // self.cw), 0)
+        gx2 = min(int((x2 - self.x0) // self.cw), self.nx - 1)
+        gy1 = max(int((y1 - self.y0) // self.ch), 0)
+        gy2 = min(int((y2 - self.y0) // self.ch), self.ny - 1)
+        if gx1 > gx2 or gy1 > gy2:
+            return np.empty(0, dtype=np.int64)
+
+        columns = np.arange(gx1, gx2 + 1) * self.ny
+        starts = np.searchsorted(self.keys, columns + gy1, side="left")
+        ends = np.searchsorted(self.keys, columns + gy2, side="right")
+        candidates = np.concatenate([self.index[s:e] for s, e in zip(starts, ends)])
+
+        xc, yc = self.x[candidates], self.y[candidates]
+        is_in = (xc > x1) & (xc < x2) & (yc > y1) & (yc < y2)
+        return np.sort(candidates[is_in])
+
+
 def get_renderer(fig):
     try:
         return fig.canvas.get_renderer()
@@ -132,6 +198,31 @@ def get_renderer(fig):
         return fig.canvas.renderer
 
 
+def get_layout_renderer(ax):
+    """Get a renderer and bring the limits and layout of ``ax`` up to date
+    without drawing the figure.
+
+    The texts are measured by the renderer directly, so the data collections
+    (e.g. millions of points) are not rasterized just for placing the labels.
+    Fall back to a full draw if the canvas can't provide a renderer.
+    """
+    fig = ax.get_figure()
+
+    # Apply the pending autoscaling of the view limits.
+    ax.get_xlim()
+    ax.get_ylim()
+    try:
+        r = fig.canvas.get_renderer()
+    except AttributeError:
+        fig.canvas.draw()
+        return get_renderer(fig)
+
+    engine = fig.get_layout_engine() if hasattr(fig, "get_layout_engine") else None
+    if engine is not None:
+        engine.execute(fig)
+    return r
+
+
 def overlap_bbox_and_point(bbox, xp, yp):
     """Given a bbox that contains a given point, return the (x, y) displacement
     necessary to make the bbox not overlap the point."""
@@ -156,6 +247,120 @@ def overlap_bbox_and_point(bbox, xp, yp):
     return dx, dy
 
 
+def overlap_bbox_and_points(extents, xp, yp):
+    """The vectorized ``overlap_bbox_and_point`` for arrays of points ``xp``
+    and ``yp`` inside the bbox of ``extents``: (x0, y0, x1, y1)."""
+    x0, y0, x1, y1 = extents
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    dx = np.where(cx < xp, xp - x1, np.where(cx > xp, xp - x0, 0.0))
+    dy = np.where(cy < yp, yp - y1, np.where(cy > yp, yp - y0, 0.0))
+    return dx, dy
+
+
+class TextBboxes(object):
+    """The bboxes of texts in display coordinates, which are kept in arrays
+    while the texts are being moved.
+
+    The size of each text is measured by the renderer only once, then the bboxes
+    are calculated from the anchor positions ``xy`` and the alignments
+    arithmetically. The Text objects are only changed by ``commit()``.
+
+    Parameters
+    ----------
+    texts : list
+        A list of :obj:`matplotlib.text.Text` objects.
+    renderer : renderer
+    ax : Axes
+    """
+    _HA = {"left": 0.0, "center": 0.5, "right": 1.0}
+    _VA = {"bottom": 0.0, "center": 0.5, "top": 1.0}
+
+    def __init__(self, texts, renderer, ax):
+        self.texts = list(texts)
+        self.renderer = renderer
+        self.ax = ax
+        self.xy = np.array([get_text_position(t, ax) for t in self.texts], dtype=float).reshape(-1, 2)
+        self.ha = [t.get_ha() for t in self.texts]
+        self.va = [t.get_va() for t in self.texts]
+
+        # The offset of the lower left corner of bbox from the anchor and the size of bbox.
+        self.offset = np.zeros((len(self.texts), 2))
+        self.size = np.zeros((len(self.texts), 2))
+        self._is_plain = [t.get_rotation() == 0 for t in self.texts]
+        self._measured = {}
+        for i in range(len(self.texts)):
+            self.offset[i], self.size[i] = self._measure(i, self.ha[i], self.va[i])
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _measure(self, i, ha, va):
+        """Measure the bbox of text ``i`` with alignment (``ha``, ``va``) by renderer."""
+        if (i, ha, va) not in self._measured:
+            text = self.texts[i]
+            old_ha, old_va = text.get_ha(), text.get_va()
+            text.set_ha(ha)
+            text.set_va(va)
+            bbox = text.get_window_extent(self.renderer)
+            x, y = get_text_position(text, self.ax)
+            text.set_ha(old_ha)
+            text.set_va(old_va)
+            self._measured[(i, ha, va)] = (bbox.x0 - x, bbox.y0 - y), (bbox.width, bbox.height)
+
+        return self._measured[(i, ha, va)]
+
+    def alignment_bbox(self, i, ha, va):
+        """The (offset, size) of the bbox of text ``i`` with alignment (``ha``, ``va``),
+        an empty ``ha`` or ``va`` means the current one."""
+        ha = ha or self.ha[i]
+        va = va or self.va[i]
+        if self._is_plain[i] and ha in self._HA and va in self._VA:
+            w, h = self.size[i]
+            return (-self._HA[ha] * w, -self._VA[va] * h), (w, h)
+
+        return self._measure(i, ha, va)
+
+    def set_alignment(self, i, ha, va):
+        self.offset[i], self.size[i] = self.alignment_bbox(i, ha, va)
+        self.ha[i] = ha or self.ha[i]
+        self.va[i] = va or self.va[i]
+
+    def extents(self, expand=(1, 1)):
+        """The (n, 4) array of (x0, y0, x1, y1) of the bboxes expanded by ``expand``."""
+        return _expand_extents(self.xy + self.offset, self.size, expand)
+
+    def move(self, delta_x, delta_y):
+        self.xy[:, 0] += delta_x
+        self.xy[:, 1] += delta_y
+
+    def commit(self):
+        """Set the positions and alignments to the Text objects."""
+        for text, (x, y), ha, va in zip(self.texts, self.xy, self.ha, self.va):
+            text.set_ha(ha)
+            text.set_va(va)
+            set_text_position(text, x, y)
+        return self.texts
+
+
+def _expand_extents(corner, size, expand):
+    """The (n, 4) extents of bboxes from the lower left ``corner`` and ``size``,
+    expanded like ``Bbox.expanded(*expand)``."""
+    corner = np.asarray(corner, dtype=float).reshape(-1, 2)
+    size = np.asarray(size, dtype=float).reshape(-1, 2)
+    delta = (size * np.asarray(expand, dtype=float) - size) / 2.0
+    return np.hstack([corner - delta, corner + size + delta])
+
+
+def _as_extents(bboxes):
+    """The (n, 4) array of (x0, y0, x1, y1) of a list of Bbox."""
+    return np.array([b.extents for b in bboxes], dtype=float).reshape(-1, 4)
+
+
+def _axes_extents(ax):
+    ax_bbox = ax.patch.get_extents()
+    return ax_bbox.xmin, ax_bbox.ymin, ax_bbox.xmax, ax_bbox.ymax
+
+
 def move_texts(texts, delta_x, delta_y, bboxes=None, renderer=None, ax=None):
     ax = ax or plt.gca()
     if bboxes is None:
@@ -184,6 +389,16 @@ def move_texts(texts, delta_x, delta_y, bboxes=None, renderer=None, ax=None):
         set_text_position(text, newx, newy)
 
 
+def _move_boxes(boxes, delta_x, delta_y, ax_extents, extents=None):
+    """``move_texts`` for ``TextBboxes``: a text doesn't move along x (or y) if
+    its bbox (``extents``) would be moved out of the axes."""
+    e = boxes.extents() if extents is None else extents
+    xmin, ymin, xmax, ymax = ax_extents
+    delta_x = np.where((e[:, 0] + delta_x < xmin) | (e[:, 2] + delta_x > xmax), 0, delta_x)
+    delta_y = np.where((e[:, 1] + delta_y < ymin) | (e[:, 3] + delta_y > ymax), 0, delta_y)
+    boxes.move(delta_x, delta_y)
+
+
 def optimally_align_text(
         x,
         y,
@@ -193,22 +408,27 @@ def optimally_align_text(
         renderer=None,
         ax=None,
         direction="xy",
+        points=None,
 ):
     """
     For all text objects find alignment that causes the least overlap with
-    points and other texts and apply it
+    points and other texts and apply it. ``points`` is an optional
+    ``PointGrid`` of (x, y).
     """
-    if add_bboxes is None:
-        add_bboxes = []
-
     ax = ax or plt.gca()
     r = renderer or get_renderer(ax.get_figure())
-    ax_bbox = ax.patch.get_extents()
-    xmin = ax_bbox.xmin
-    xmax = ax_bbox.xmax
-    ymin = ax_bbox.ymin
-    ymax = ax_bbox.ymax
-    bboxes = get_bboxes(texts, r, expand, ax=ax)
+    if points is None:
+        points = PointGrid(x, y)
+
+    boxes = TextBboxes(texts, r, ax)
+    add = _as_extents(add_bboxes if add_bboxes is not None else [])
+    _optimally_align(boxes, points, expand, add, direction, _axes_extents(ax))
+    return boxes.commit()
+
+
+def _optimally_align(boxes, points, expand, add_extents, direction, ax_extents):
+    """``optimally_align_text`` for ``TextBboxes``."""
+    xmin, ymin, xmax, ymax = ax_extents
     if "x" not in direction:
         ha = [""]
     else:
@@ -218,46 +438,38 @@ def optimally_align_text(
     else:
         va = ["bottom", "top", "center"]
     alignment = list(product(ha, va))
-    #    coords = np.array(zip(x, y))
-    for i, text in enumerate(texts):
-        #        tcoords = np.array(text.get_position()).T
-        #        nonself_coords = coords[~np.all(coords==tcoords, axis=1)]
-        #        nonself_x, nonself_y = np.split(nonself_coords, 2, axis=1)
-        counts = []
-        for h, v in alignment:
-            if h:
-                text.set_ha(h)
-            if v:
-                text.set_va(v)
-            bbox = text.get_window_extent(r).expanded(*expand)
-            c = len(get_points_inside_bbox(x, y, bbox))
-            intersections = [
-                bbox.intersection(bbox, bbox2) if i != j else None
-                for j, bbox2 in enumerate(bboxes + add_bboxes)
-            ]
-            intersections = sum(
-                [abs(b.width * b.height) if b is not None else 0 for b in intersections]
-            )
-            # Check for out-of-axes position
-            bbox = text.get_window_extent(r)
-            x1, y1, x2, y2 = bbox.xmin, bbox.ymin, bbox.xmax, bbox.ymax
-            if x1 < xmin or x2 > xmax or y1 < ymin or y2 > ymax:
-                axout = 1
-            else:
-                axout = 0
-            counts.append((axout, c, intersections))
+
+    extents = np.vstack([boxes.extents(expand), add_extents])
+    for i in range(len(boxes)):
+        # The bboxes of text i with all the candidate alignments
+        candidates = [boxes.alignment_bbox(i, h, v) for h, v in alignment]
+        corner = boxes.xy[i] + np.array([offset for offset, _ in candidates])
+        size = np.array([size for _, size in candidates])
+        bx0, by0, bx1, by1 = _expand_extents(corner, size, expand).T
+
+        # The number of points inside each candidate
+        c = np.array([len(points.inside_extents(*e)) for e in zip(bx0, by0, bx1, by1)])
+
+        # The total area of intersections with all the other texts and objects
+        w = np.minimum(bx1[:, None], extents[:, 2]) - np.maximum(bx0[:, None], extents[:, 0])
+        h = np.minimum(by1[:, None], extents[:, 3]) - np.maximum(by0[:, None], extents[:, 1])
+        is_overlap = (w >= 0) & (h >= 0)
+        is_overlap[:, i] = False
+        intersections = np.where(is_overlap, np.abs(w * h), 0).sum(axis=1)
+
+        # Check for out-of-axes position
+        axout = ((corner[:, 0] < xmin) | (corner[:, 0] + size[:, 0] > xmax) |
+                 (corner[:, 1] < ymin) | (corner[:, 1] + size[:, 1] > ymax)).astype(int)
+
         # Most important: prefer alignments that keep the text inside the axes.
         # If tied, take the alignments that minimize the number of x, y points
         # contained inside the text.
         # Break any remaining ties by minimizing the total area of intersections
         # with all text bboxes and other objects to avoid.
-        a, value = min(enumerate(counts), key=itemgetter(1))
-        if "x" in direction:
-            text.set_ha(alignment[a][0])
-        if "y" in direction:
-            text.set_va(alignment[a][1])
-        bboxes[i] = text.get_window_extent(r).expanded(*expand)
-    return texts
+        a = np.lexsort((intersections, c, axout))[0]
+        boxes.set_alignment(i, *alignment[a])
+        extents[i] = _expand_extents(boxes.xy[i] + boxes.offset[i], boxes.size[i], expand)[0]
+    return boxes
 
 
 def repel_text(
@@ -272,42 +484,44 @@ def repel_text(
     """
     ax = ax or plt.gca()
     r = renderer or get_renderer(ax.get_figure())
-    bboxes = get_bboxes(texts, r, expand, ax=ax)
-    xmins = [bbox.xmin for bbox in bboxes]
-    xmaxs = [bbox.xmax for bbox in bboxes]
-    ymaxs = [bbox.ymax for bbox in bboxes]
-    ymins = [bbox.ymin for bbox in bboxes]
-
-    overlaps_x = np.zeros((len(bboxes), len(bboxes)))
-    overlaps_y = np.zeros_like(overlaps_x)
-    overlap_directions_x = np.zeros_like(overlaps_x)
-    overlap_directions_y = np.zeros_like(overlaps_y)
-    for i, bbox1 in enumerate(bboxes):
-        overlaps = get_points_inside_bbox(
-            xmins * 2 + xmaxs * 2, (ymins + ymaxs) * 2, bbox1
-        ) % len(bboxes)
-        overlaps = np.unique(overlaps)
-        for j in overlaps:
-            bbox2 = bboxes[j]
-            x, y = bbox1.intersection(bbox1, bbox2).size
-            overlaps_x[i, j] = x
-            overlaps_y[i, j] = y
-            direction = np.sign(bbox1.extents - bbox2.extents)[:2]
-            overlap_directions_x[i, j] = direction[0]
-            overlap_directions_y[i, j] = direction[1]
-
-    move_x = overlaps_x * overlap_directions_x
-    move_y = overlaps_y * overlap_directions_y
-
-    delta_x = move_x.sum(axis=1)
-    delta_y = move_y.sum(axis=1)
-
-    q = np.sum(overlaps_x), np.sum(overlaps_y)
+    boxes = TextBboxes(texts, r, ax)
+    extents = boxes.extents(expand)
+    delta_x, delta_y, q = _repel_text(extents)
     if move:
-        move_texts(texts, delta_x, delta_y, bboxes, ax=ax)
+        _move_boxes(boxes, delta_x, delta_y, _axes_extents(ax), extents)
+        boxes.commit()
     return delta_x, delta_y, q
 
 
+def _repel_text(extents, chunksize=1 << 22):
+    """``repel_text`` for the (n, 4) ``extents`` of the expanded text bboxes.
+
+    A text j repels text i if any corner of j is inside i. All the pairs are
+    computed by broadcasting, in blocks of about ``chunksize`` pairs.
+    """
+    n = len(extents)
+    rows = max(1, chunksize // max(n, 1))
+    xmins, ymins, xmaxs, ymaxs = extents.T
+    delta_x = np.zeros(n)
+    delta_y = np.zeros(n)
+    qx, qy = 0.0, 0.0
+    for start in range(0, n, rows):
+        x0, y0, x1, y1 = [v[start:start + rows, None] for v in (xmins, ymins, xmaxs, ymaxs)]
+
+        # [i, j]: any corner of the j'th text is inside the i'th text
+        is_in = (((xmins > x0) & (xmins < x1)) | ((xmaxs > x0) & (xmaxs < x1))) & \
+                (((ymins > y0) & (ymins < y1)) | ((ymaxs > y0) & (ymaxs < y1)))
+        overlaps_x = np.where(is_in, np.minimum(x1, xmaxs) - np.maximum(x0, xmins), 0)
+        overlaps_y = np.where(is_in, np.minimum(y1, ymaxs) - np.maximum(y0, ymins), 0)
+
+        delta_x[start:start + rows] = (overlaps_x * np.sign(x0 - xmins)).sum(axis=1)
+        delta_y[start:start + rows] = (overlaps_y * np.sign(y0 - ymins)).sum(axis=1)
+        qx += overlaps_x.sum()
+        qy += overlaps_y.sum()
+
+    return delta_x, delta_y, (qx, qy)
+
+
 def repel_text_from_bboxes(
         add_bboxes,
         texts,
@@ -327,39 +541,32 @@ def repel_text_from_bboxes(
     """
     ax = ax or plt.gca()
     r = renderer or get_renderer(ax.get_figure())
+    boxes = TextBboxes(texts, r, ax)
+    extents = boxes.extents(expand)
+    delta_x, delta_y, q = _repel_text_from_extents(extents, _as_extents(add_bboxes))
+    if move:
+        _move_boxes(boxes, delta_x, delta_y, _axes_extents(ax), extents)
+        boxes.commit()
+    return delta_x, delta_y, q
 
-    bboxes = get_bboxes(texts, r, expand, ax=ax)
-
-    overlaps_x = np.zeros((len(bboxes), len(add_bboxes)))
-    overlaps_y = np.zeros_like(overlaps_x)
-    overlap_directions_x = np.zeros_like(overlaps_x)
-    overlap_directions_y = np.zeros_like(overlaps_y)
-
-    for i, bbox1 in enumerate(bboxes):
-        for j, bbox2 in enumerate(add_bboxes):
-            try:
-                x, y = bbox1.intersection(bbox1, bbox2).size
-                direction = np.sign(bbox1.extents - bbox2.extents)[:2]
-                overlaps_x[i, j] = x
-                overlaps_y[i, j] = y
-                overlap_directions_x[i, j] = direction[0]
-                overlap_directions_y[i, j] = direction[1]
-            except AttributeError:
-                pass
-
-    move_x = overlaps_x * overlap_directions_x
-    move_y = overlaps_y * overlap_directions_y
 
-    delta_x = move_x.sum(axis=1)
-    delta_y = move_y.sum(axis=1)
+def _repel_text_from_extents(extents, add_extents):
+    """``repel_text_from_bboxes`` for the (n, 4) ``extents`` of the expanded
+    text bboxes and the (m, 4) ``add_extents`` of the other objects."""
+    t, o = extents[:, None, :], add_extents[None, :, :]
+    overlaps_x = np.minimum(t[..., 2], o[..., 2]) - np.maximum(t[..., 0], o[..., 0])
+    overlaps_y = np.minimum(t[..., 3], o[..., 3]) - np.maximum(t[..., 1], o[..., 1])
+    is_overlap = (overlaps_x >= 0) & (overlaps_y >= 0)  # False for the empty (NaN) bboxes
+    overlaps_x = np.where(is_overlap, overlaps_x, 0)
+    overlaps_y = np.where(is_overlap, overlaps_y, 0)
 
-    q = np.sum(overlaps_x), np.sum(overlaps_y)
-    if move:
-        move_texts(texts, delta_x, delta_y, bboxes, ax=ax)
-    return delta_x, delta_y, q
+    delta_x = np.where(is_overlap, overlaps_x * np.sign(t[..., 0] - o[..., 0]), 0).sum(axis=1)
+    delta_y = np.where(is_overlap, overlaps_y * np.sign(t[..., 1] - o[..., 1]), 0).sum(axis=1)
+    return delta_x, delta_y, (np.sum(overlaps_x), np.sum(overlaps_y))
 
 
-def repel_text_from_points(x, y, texts, renderer=None, ax=None, expand=(1.2, 1.2), move=False):
+def repel_text_from_points(x, y, texts, renderer=None, ax=None, expand=(1.2, 1.2), move=False,
+                           points=None):
     """
     Repel texts from all points specified by x and y while expanding their
     (texts'!) bounding boxes by expandby  (x, y), e.g. (1.2, 1.2)
@@ -367,60 +574,65 @@ def repel_text_from_points(x, y, texts, renderer=None, ax=None, expand=(1.2, 1.2
     Requires a renderer to get the actual sizes of the text, and to that end
     either one needs to be directly provided, or the axes have to be specified,
     and the renderer is then got from the axes object.
+    ``points`` is an optional ``PointGrid`` of (x, y), which should be built
+    once and reused between iterations.
     """
     assert len(x) == len(y)
     ax = ax or plt.gca()
     r = renderer or get_renderer(ax.get_figure())
-    bboxes = get_bboxes(texts, r, expand, ax=ax)
-
-    # move_x[i,j] is the x displacement of the i'th text caused by the j'th point
-    move_x = np.zeros((len(bboxes), len(x)))
-    move_y = np.zeros((len(bboxes), len(x)))
-    for i, bbox in enumerate(bboxes):
-        xy_in = get_points_inside_bbox(x, y, bbox)
-        for j in xy_in:
-            xp, yp = x[j], y[j]
-            dx, dy = overlap_bbox_and_point(bbox, xp, yp)
-
-            move_x[i, j] = dx
-            move_y[i, j] = dy
-
-    delta_x = move_x.sum(axis=1)
-    delta_y = move_y.sum(axis=1)
-    q = np.sum(np.abs(move_x)), np.sum(np.abs(move_y))
+    if points is None:
+        points = PointGrid(x, y)
+
+    boxes = TextBboxes(texts, r, ax)
+    extents = boxes.extents(expand)
+    delta_x, delta_y, q = _repel_text_from_points(extents, points)
     if move:
-        move_texts(texts, delta_x, delta_y, bboxes, ax=ax)
+        _move_boxes(boxes, delta_x, delta_y, _axes_extents(ax), extents)
+        boxes.commit()
     return delta_x, delta_y, q
 
 
+def _repel_text_from_points(extents, points):
+    """``repel_text_from_points`` for the (n, 4) ``extents`` of the expanded
+    text bboxes and the ``PointGrid`` of points."""
+    # Only the points inside a text's bbox move it, accumulate them text by text.
+    delta_x = np.zeros(len(extents))
+    delta_y = np.zeros(len(extents))
+    qx, qy = 0.0, 0.0
+    for i, e in enumerate(extents):
+        xy_in = points.inside_extents(*e)
+        if len(xy_in) == 0:
+            continue
+
+        dx, dy = overlap_bbox_and_points(e, points.x[xy_in], points.y[xy_in])
+        delta_x[i], delta_y[i] = dx.sum(), dy.sum()
+        qx += np.abs(dx).sum()
+        qy += np.abs(dy).sum()
+
+    return delta_x, delta_y, (qx, qy)
+
+
 def repel_text_from_axes(texts, ax=None, bboxes=None, renderer=None, expand=None):
     ax = ax or plt.gca()
     r = renderer or get_renderer(ax.get_figure())
     if expand is None:
         expand = (1, 1)
-    if bboxes is None:
-        bboxes = get_bboxes(texts, r, expand=expand, ax=ax)
-    ax_bbox = ax.patch.get_extents()
-    xmin = ax_bbox.xmin
-    xmax = ax_bbox.xmax
-    ymin = ax_bbox.ymin
-    ymax = ax_bbox.ymax
-    for i, bbox in enumerate(bboxes):
-        x1, y1, x2, y2 = bbox.xmin, bbox.ymin, bbox.xmax, bbox.ymax
-        dx, dy = 0, 0
-        if x1 < xmin:
-            dx = xmin - x1
-        if x2 > xmax:
-            dx = xmax - x2
-        if y1 < ymin:
-            dy = ymin - y1
-        if y2 > ymax:
-            dy = ymax - y2
-        if dx or dy:
-            x, y = get_text_position(texts[i], ax)
-            newx, newy = x + dx, y + dy
-            set_text_position(texts[i], newx, newy)
-    return texts
+
+    boxes = TextBboxes(texts, r, ax)
+    extents = boxes.extents(expand) if bboxes is None else _as_extents(bboxes)
+    _repel_text_from_axes(boxes, extents, _axes_extents(ax))
+    return boxes.commit()
+
+
+def _repel_text_from_axes(boxes, extents, ax_extents):
+    """``repel_text_from_axes`` for ``TextBboxes``: move the texts whose bboxes
+    (``extents``) are out of the axes back."""
+    xmin, ymin, xmax, ymax = ax_extents
+    x1, y1, x2, y2 = extents.T
+    dx = np.where(x2 > xmax, xmax - x2, np.where(x1 < xmin, xmin - x1, 0))
+    dy = np.where(y2 > ymax, ymax - y2, np.where(y1 < ymin, ymin - y1, 0))
+    boxes.move(dx, dy)
+    return boxes
 
 
 def float_to_tuple(a):
@@ -436,6 +648,48 @@ def float_to_tuple(a):
         return b
 
 
+class AdjustTextTelemetry(object):
+    """A record of the iterations of ``adjust_text``, pass it to ``adjust_text``
+    by ``telemetry=AdjustTextTelemetry()`` and read it after the call.
+
+    Attributes
+    ----------
+    qx, qy : list of float
+        The total overlaps along x and y (in pixels) of every iteration.
+
+    time_text, time_points, time_objects : float
+        The time in seconds spent in repelling texts from texts, from points and
+        from other objects.
+
+    n_iter : int
+        The number of iterations.
+
+    elapsed : float
+        The wall-clock time in seconds of ``adjust_text``.
+
+    stop_reason : str
+        Why the iterations stopped: "precision" (the overlaps are less than
+        ``precision``), "no_improvement" (the overlaps stop decreasing in the
+        last 10 iterations), "lim" (reached ``lim`` iterations) or "time_limit"
+        (reached ``time_limit``, the best layout seen is kept).
+    """
+    def __init__(self):
+        self.qx = []
+        self.qy = []
+        self.time_text = 0.0
+        self.time_points = 0.0
+        self.time_objects = 0.0
+        self.n_iter = 0
+        self.elapsed = 0.0
+        self.stop_reason = None
+
+    def __repr__(self):
+        return ("AdjustTextTelemetry(n_iter=%d, stop_reason=%r, elapsed=%.3fs, "
+                "time_text=%.3fs, time_points=%.3fs, time_objects=%.3fs)" % (
+                    self.n_iter, self.stop_reason, self.elapsed,
+                    self.time_text, self.time_points, self.time_objects))
+
+
 def adjust_text(
         texts,
         x=None,
@@ -462,6 +716,8 @@ def adjust_text(
         save_prefix="",
         save_format="png",
         add_step_numbers=True,
+        time_limit=None,
+        telemetry=None,
         *args,
         **kwargs):
     """Iteratively adjusts the locations of texts.
@@ -557,6 +813,12 @@ def adjust_text(
     add_step_numbers : bool, default True
         if `save_steps` is True, whether to add step numbers as titles to the
         images of saving steps.
+    time_limit : float or None, default None
+        the wall-clock budget in seconds of the iterations, the best layout
+        seen (the smallest overlaps) is kept when it's reached.
+    telemetry : AdjustTextTelemetry or None, default None
+        if provided, it's filled with the overlaps of every iteration, the
+        time spent in each kind of repulsion and the stopping reason.
     args and kwargs :
         any arguments will be fed into obj:`ax.annotate` after all the
         optimization is done just for plotting the connecting arrows if
@@ -569,20 +831,22 @@ def adjust_text(
     """
     if only_move is None:
         only_move = {"points": "xy", "text": "xy", "objects": "xy"}
+    if telemetry is None:
+        telemetry = AdjustTextTelemetry()
 
-    plt.draw()
+    start_time = time.perf_counter()
     ax = ax or plt.gca()
-    r = get_renderer(ax.get_figure())
+    r = get_layout_renderer(ax)
     transform = texts[0].get_transform()
     if (x is not None) & (y is not None):
-        for ix, tupxy in enumerate(zip(x, y)):
-            t_x, t_y = transform.transform(tupxy)
-            x[ix] = t_x
-            y[ix] = t_y
-
-    orig_xy = [get_text_position(text, ax) for text in texts]
-    orig_x = [xy[0] for xy in orig_xy]
-    orig_y = [xy[1] for xy in orig_xy]
+        xy = transform.transform(np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)]))
+        x, y = xy[:, 0], xy[:, 1]
+
+    # Measure the texts once, they are moved in ``boxes`` and only committed
+    # to the Text objects at the end (or for saving steps).
+    boxes = TextBboxes(texts, r, ax)
+    ax_extents = _axes_extents(ax)
+    orig_x, orig_y = boxes.xy[:, 0].copy(), boxes.xy[:, 1].copy()
     force_objects = float_to_tuple(force_objects)
     force_text = float_to_tuple(force_text)
     force_points = float_to_tuple(force_points)
@@ -590,9 +854,7 @@ def adjust_text(
     #    xdiff = np.diff(ax.get_xlim())[0]
     #    ydiff = np.diff(ax.get_ylim())[0]
 
-    bboxes = get_bboxes(texts, r, (1.0, 1.0), ax)
-    sum_width = np.sum(list(map(lambda bbox: bbox.width, bboxes)))
-    sum_height = np.sum(list(map(lambda bbox: bbox.height, bboxes)))
+    sum_width, sum_height = boxes.size.sum(axis=0)
     if not any(list(map(lambda val: "x" in val, only_move.values()))):
         precision_x = np.inf
     else:
@@ -613,23 +875,27 @@ def adjust_text(
             raise ValueError("Please specify both x and y, or neither")
     if y is None:
         raise ValueError("Please specify both x and y, or neither")
+
+    # Index the points once, the cell size is about the size of the texts.
+    points = PointGrid(x, y, cell_size=tuple(np.median(boxes.size, axis=0) * expand_points))
+
     if add_objects is None:
         text_from_objects = False
-        add_bboxes = []
+        add_extents = _as_extents([])
     else:
         try:
-            add_bboxes = get_bboxes(add_objects, r, (1, 1), ax)
+            add_extents = _as_extents(get_bboxes(add_objects, r, (1, 1), ax))
         except:
             raise ValueError("Can't get bounding boxes from add_objects - is it a "
                              "flat list of matplotlib objects?")
 
         text_from_objects = True
 
-    for text in texts:
-        text.set_va(va)
-        text.set_ha(ha)
+    for i in range(len(boxes)):
+        boxes.set_alignment(i, ha, va)
 
     if save_steps:
+        boxes.commit()
         if add_step_numbers:
             plt.title("Before")
         plt.savefig("%s%s.%s" % (save_prefix, "000a", save_format), format=save_format, dpi=150)
@@ -638,50 +904,47 @@ def adjust_text(
         if autoalign is True:
             autoalign = "xy"
         for i in range(2):
-            texts = optimally_align_text(
-                x,
-                y,
-                texts,
-                expand=expand_align,
-                add_bboxes=add_bboxes,
-                direction=autoalign,
-                renderer=r,
-                ax=ax,
-            )
+            _optimally_align(boxes, points, expand_align, add_extents, autoalign, ax_extents)
 
     if save_steps:
+        boxes.commit()
         if add_step_numbers:
             plt.title("Autoaligned")
         plt.savefig(
             "%s%s.%s" % (save_prefix, "000b", save_format), format=save_format, dpi=150
         )
 
-    texts = repel_text_from_axes(texts, ax, renderer=r, expand=expand_points)
+    _repel_text_from_axes(boxes, boxes.extents(expand_points), ax_extents)
     history = [(np.inf, np.inf)] * 10
+    best_score, best_xy = np.inf, None
+    telemetry.stop_reason = "lim"
     for i in range(lim):
         #        q1, q2 = [np.inf, np.inf], [np.inf, np.inf]
 
+        t0 = time.perf_counter()
         if avoid_text:
-            d_x_text, d_y_text, q1 = repel_text(
-                texts, renderer=r, ax=ax, expand=expand_text
-            )
+            d_x_text, d_y_text, q1 = _repel_text(boxes.extents(expand_text))
         else:
             d_x_text, d_y_text, q1 = [0] * len(texts), [0] * len(texts), (0, 0)
 
+        t1 = time.perf_counter()
         if avoid_points:
-            d_x_points, d_y_points, q2 = repel_text_from_points(
-                x, y, texts, ax=ax, renderer=r, expand=expand_points
-            )
+            d_x_points, d_y_points, q2 = _repel_text_from_points(boxes.extents(expand_points), points)
         else:
             d_x_points, d_y_points, q2 = [0] * len(texts), [0] * len(texts), (0, 0)
 
+        t2 = time.perf_counter()
         if text_from_objects:
-            d_x_objects, d_y_objects, q3 = repel_text_from_bboxes(
-                add_bboxes, texts, ax=ax, renderer=r, expand=expand_objects
-            )
+            d_x_objects, d_y_objects, q3 = _repel_text_from_extents(boxes.extents(expand_objects),
+                                                                    add_extents)
         else:
             d_x_objects, d_y_objects, q3 = [0] * len(texts), [0] * len(texts), (0, 0)
 
+        t3 = time.perf_counter()
+        telemetry.time_text += t1 - t0
+        telemetry.time_points += t2 - t1
+        telemetry.time_objects += t3 - t2
+
         if only_move:
             if "text" in only_move:
                 if "x" not in only_move["text"]:
@@ -711,11 +974,18 @@ def adjust_text(
         )
         qx = np.sum([q[0] for q in [q1, q2, q3]])
         qy = np.sum([q[1] for q in [q1, q2, q3]])
+        telemetry.qx.append(float(qx))
+        telemetry.qy.append(float(qy))
+        if time_limit is not None and qx / sum_width + qy / sum_height < best_score:
+            # The overlaps are of the layout before this move.
+            best_score, best_xy = qx / sum_width + qy / sum_height, boxes.xy.copy()
+
         histm = np.max(np.array(history), axis=0)
         history.pop(0)
         history.append((qx, qy))
-        move_texts(texts, dx, dy, bboxes=get_bboxes(texts, r, (1, 1), ax), ax=ax)
+        _move_boxes(boxes, dx, dy, ax_extents)
         if save_steps:
+            boxes.commit()
             if add_step_numbers:
                 plt.title(i + 1)
             plt.savefig(
@@ -725,21 +995,33 @@ def adjust_text(
             )
         # Stop if we've reached the precision threshold, or if the x and y displacement
         # are both greater than the max over the last 10 iterations (suggesting a
-        # failure to converge)
-        if (qx < precision_x and qy < precision_y) or np.all([qx, qy] >= histm):
+        # failure to converge), or if we've run out of the time budget.
+        if qx < precision_x and qy < precision_y:
+            telemetry.stop_reason = "precision"
+            break
+        if np.all([qx, qy] >= histm):
+            telemetry.stop_reason = "no_improvement"
             break
+        if time_limit is not None and time.perf_counter() - start_time > time_limit:
+            telemetry.stop_reason = "time_limit"
+            if best_xy is not None:
+                boxes.xy[:] = best_xy
+            break
+
+    telemetry.n_iter = i + 1
+    texts = boxes.commit()
 
     # Now adding arrows from texts to their original locations if required
     if "arrowprops" in kwargs:
-        bboxes = get_bboxes(texts, r, (1, 1), ax)
+        extents = boxes.extents()
         kwap = kwargs.pop("arrowprops")
-        for j, (bbox, text) in enumerate(zip(bboxes, texts)):
+        for j, ((x0, y0, x1, y1), text) in enumerate(zip(extents, texts)):
             ap = {"patchA": text}  # Ensure arrow is clipped by the text
             ap.update(kwap)  # Add arrowprops from kwargs
             ax.annotate(
                 "",  # Add an arrow from the text to the point
                 xy=get_orig_coords(transform, orig_x[j], orig_y[j]),
-                xytext=transform.inverted().transform(get_midpoint(bbox)),
+                xytext=transform.inverted().transform(((x0 + x1) / 2, (y0 + y1) / 2)),
                 arrowprops=ap,
                 xycoords=transform,
                 textcoords=transform,
@@ -755,4 +1037,5 @@ def adjust_text(
                 format=save_format,
                 dpi=150)
 
+    telemetry.elapsed = time.perf_counter() - start_time
     return i+1
@@ -0,0 +1,248 @@
+"""An on-disk cache of the columns loaded by ``read_sumstats``.
+
+Author: Shujia Huang
+Date: 2026-10-18
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bump it when the layout of the cache files is changed.
+_CACHE_VERSION = 3
+_META = "meta.json"
+_IDS = "ids.txt"
+
+
+class SumstatsCache(object):
+    """A size-bounded cache of the DataFrames returned by ``read_sumstats``.
+
+    Each entry is a directory of ``.npy`` files, one for each column (the
+    categorical columns are stored as the codes and the categories), which can
+    be memory-mapped, and a ``meta.json``. An entry is keyed by the path, size
+    and modification time of the input file (of all the files for a dataset
+    directory) and the options which change the loaded data, so any change of
+    the input makes a new entry. The least recently used entries are removed
+    when the total size is larger than ``max_size``.
+
+    The SNP IDs of all the sites are stored once as utf-8 lines in ``ids.txt``
+    with the offset of each line, so that one entry serves any ``sign_marker_p``
+    and ``load`` only reads and decodes the IDs of the sites under the cutoff.
+
+    Parameters
+    ----------
+    cache_dir : string
+        The directory of the cache, it's created if it doesn't exist.
+
+    max_size : integer, default is 20GB, optional
+        The largest total size in bytes of the cache.
+    """
+    def __init__(self, cache_dir, max_size=20 << 30):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, fname, **options):
+        """The key of the data loaded from ``fname`` with ``options``."""
+        fname = os.path.abspath(fname)
+        if os.path.isdir(fname):
+            stats = []
+            for root, dirs, files in os.walk(fname):
+                dirs.sort()
+                for f in sorted(files):
+                    st = os.stat(os.path.join(root, f))
+                    stats.append([os.path.relpath(os.path.join(root, f), fname), st.st_size, st.st_mtime_ns])
+        else:
+            st = os.stat(fname)
+            stats = [st.st_size, st.st_mtime_ns]
+
+        identity = json.dumps([_CACHE_VERSION, fname, stats, sorted(options.items())], default=str)
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def load(self, key, sign_marker_p=None):
+        """Load the DataFrame of ``key``, None if it's not in the cache.
+
+        If ``sign_marker_p`` is set, only the SNP IDs of the sites with p-value
+        <= ``sign_marker_p`` are kept, as ``read_sumstats`` does.
+        """
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(path, _META)) as fh:
+                meta = json.load(fh)
+
+            columns = {}
+            for i, (name, kind) in enumerate(meta["columns"]):
+                if kind == "ids":
+                    continue
+
+                columns[name] = np.load(os.path.join(path, "%d.npy" % i), mmap_mode="r")
+                if kind == "category":
+                    categories = np.load(os.path.join(path, "%d.categories.npy" % i))
+                    columns[name] = pd.Categorical.from_codes(columns[name], categories=categories)
+
+            if meta["ids"] is not None:
+                snp, pv = meta["ids"]
+                rows = np.flatnonzero(columns[pv] <= sign_marker_p) if sign_marker_p is not None else None
+                columns[snp] = _load_ids(path, rows)
+
+            columns = {name: columns[name] for name, _ in meta["columns"]}
+
+        except (OSError, ValueError, KeyError):
+            return None  # missing, or removed by another process
+
+        # Record the time of use for the LRU eviction.
+        os.utime(os.path.join(path, _META))
+        return pd.DataFrame(columns)
+
+    def id_writer(self):
+        """A new ``IdWriter`` for the SNP IDs of the data to ``save``."""
+        return IdWriter(self.cache_dir)
+
+    def save(self, key, data, snp=None, pv=None, ids=None):
+        """Save the DataFrame ``data`` by ``key`` and evict the least recently
+        used entries if the cache is too large.
+
+        ``snp`` and ``pv`` are the columns of the SNP IDs and P values, and ``ids``
+        is the ``IdWriter`` of the IDs of all the sites, which replaces the
+        ``snp`` column of ``data`` in the cache.
+        """
+        if ids is not None:
+            ids.close()
+            tmp = ids.path
+        else:
+            tmp = tempfile.mkdtemp(prefix=".tmp.", dir=self.cache_dir)
+
+        try:
+            meta = {"version": _CACHE_VERSION, "columns": [],
+                    "ids": [snp, pv] if ids is not None else None}
+            for i, name in enumerate(data.columns):
+                values = data[name]
+                if ids is not None and name == snp:
+                    meta["columns"].append([name, "ids"])
+                elif isinstance(values.dtype, pd.CategoricalDtype):
+                    np.save(os.path.join(tmp, "%d.npy" % i), values.cat.codes.to_numpy())
+                    np.save(os.path.join(tmp, "%d.categories.npy" % i),
+                            np.asarray(values.cat.categories, dtype=str))
+                    meta["columns"].append([name, "category"])
+                else:
+                    np.save(os.path.join(tmp, "%d.npy" % i), values.to_numpy())
+                    meta["columns"].append([name, str(values.dtype)])
+
+            with open(os.path.join(tmp, _META), "w") as fh:
+                json.dump(meta, fh)
+
+            # Publish the entry at once, another process may have done the same.
+            os.rename(tmp, os.path.join(self.cache_dir, key))
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(os.path.join(self.cache_dir, key)):
+                print("[WARNING] Failed to write the cache in %s: %s" % (self.cache_dir, e))
+            return
+
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the total size of the
+        cache is not larger than ``max_size``, the entry ``keep`` is never removed."""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, key)
+            try:
+                if key.startswith(".tmp."):
+                    # A partial entry which is left by a killed process.
+                    if time.time() - os.stat(path).st_mtime > 24 * 3600:
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+
+                last_used = os.stat(os.path.join(path, _META)).st_mtime
+                size = sum(os.stat(os.path.join(path, f)).st_size for f in os.listdir(path))
+            except OSError:
+                continue
+
+            entries.append((key != keep, last_used, size, path))
+
+        total = sum(size for _, _, size, _ in entries)
+        for removable, _, size, path in sorted(entries, key=lambda e: (not e[0], e[1])):
+            if total <= self.max_size or not removable:
+                break
+
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+
+class IdWriter(object):
+    """Write the SNP IDs of all the sites block by block to a new entry of
+    ``SumstatsCache``, one utf-8 line for each site, so that they are never all
+    in memory.
+
+    Parameters
+    ----------
+    cache_dir : string
+        The directory of the cache, the IDs are in a temporary directory in it
+        until the entry is saved.
+    """
+    def __init__(self, cache_dir):
+        self.path = tempfile.mkdtemp(prefix=".tmp.", dir=cache_dir)
+        self._fh = open(os.path.join(self.path, _IDS), "wb")
+        self._lengths = []
+
+    def append(self, values):
+        """Append the IDs of a block of sites."""
+        values = [str(v) for v in values]
+        text = "\n".join(values).encode("utf-8")
+        if len(text) == sum(map(len, values)) + len(values) - 1:  # ASCII only
+            lengths = np.fromiter(map(len, values), dtype=np.int32, count=len(values))
+        else:
+            lengths = np.fromiter((len(v.encode("utf-8")) for v in values), dtype=np.int32, count=len(values))
+
+        self._lengths.append(lengths + 1)
+        if len(values):
+            self._fh.write(text)
+            self._fh.write(b"\n")
+
+    def close(self):
+        """Finish the ``ids.txt`` and write the offset of each line."""
+        if self._fh.closed:
+            return
+
+        self._fh.close()
+        lengths = np.concatenate(self._lengths) if self._lengths else np.empty(0, dtype=np.int32)
+        self._lengths = []
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(os.path.join(self.path, "ids.offsets.npy"), offsets)
+
+    def discard(self):
+        """Remove the IDs which are written, e.g. if the input fails to load."""
+        self._fh.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _load_ids(path, rows=None):
+    """The IDs in the entry ``path`` as a categorical for all the sites, only the
+    sites in ``rows`` (sorted) have an ID if it's set, the others are missing."""
+    offsets = np.load(os.path.join(path, "ids.offsets.npy"), mmap_mode="r")
+    n = len(offsets) - 1
+    if rows is None:
+        with open(os.path.join(path, _IDS), "rb") as fh:
+            text = fh.read()
+    elif len(rows):
+        # Gather the bytes of the lines of ``rows`` only.
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        index = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        text = np.memmap(os.path.join(path, _IDS), dtype=np.uint8, mode="r")[index].tobytes()
+    else:
+        text = b""
+
+    names = text.decode("utf-8").split("\n")[:-1]
+    id_codes, id_names = pd.factorize(np.array(names, dtype=object))
+    codes = np.full(n, -1, dtype=np.int32)
+    codes[slice(None) if rows is None else rows] = id_codes
+    return pd.Categorical.from_codes(codes, categories=id_names)
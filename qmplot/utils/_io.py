@@ -0,0 +1,449 @@
+"""Functions for loading association summary statistics for ``qmplot``.
+
+Author: Shujia Huang
+Date: 2026-10-18
+"""
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ._tabix import TabixIndex, parse_region
+from ._cache import SumstatsCache
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_PARQUET_MAGIC = b"PAR1"
+_ARROW_MAGIC = b"ARROW1"
+
+
+def read_sumstats(fname, chrom="#CHROM", pos="POS", pv="P", snp=None, sign_marker_p=None,
+                  CHR=None, max_p=None, region=None, chunksize=None, p_dtype="float64", threads=1,
+                  sep="\t", cache_dir=None, cache_max_size=20 << 30):
+    """Load the columns of a summary-statistics file which are needed by the plots.
+
+    Plain text, gzip, bgzip and zstd (requires ``zstandard``) files are all
+    supported, the compression is detected from the file content. Parquet and
+    Arrow IPC (Feather) files or directories (e.g. partitioned by chromosome)
+    are read by ``pyarrow``, which only reads the needed columns and skips
+    the row groups and partitions which can't pass ``CHR`` and ``max_p``.
+
+    The input is read in blocks and every block is reduced to the chromosome,
+    position and p-value columns right after it has been parsed, so the peak
+    memory tracks the size of the plotted data instead of the size of the
+    input file.
+
+    Parameters
+    ----------
+    fname : string
+        Path of the input file, e.g. PLINK2.x association output, or a Parquet
+        dataset directory.
+
+    chrom, pos, pv : string, optional
+        The column names for chromosome, chromosomal position and p-value.
+
+    snp : string, or None, optional
+        The column name for the SNP name (rs number). Default: None, do not load it.
+
+    sign_marker_p : float, or None, optional
+        If set, only the ``snp`` values of the sites with p-value <= ``sign_marker_p``
+        are kept, the others are set to be NaN. These are the only ones which
+        ``manhattanplot`` needs for annotating the top SNPs.
+
+    CHR : string, list of string, or None, optional
+        Only load the sites on this (these) chromosome(s). Default: None, load all.
+
+    max_p : float, or None, optional
+        Only load the sites with p-value <= ``max_p``. Default: None, load all.
+
+    region : string, tuple, or None, optional
+        Only load the sites in this region, e.g. "chr8:1,000,000-2,000,000" or
+        ("chr8", 1000000, 2000000). The input must be bgzipped and tabix-indexed
+        (with a .tbi or .csi index file aside), only the blocks overlapping with
+        the region are read. See ``read_sumstats_regions`` for many regions.
+
+    chunksize : integer, or None, optional
+        Number of rows for each block of a text file. Default: None, read the
+        whole file at once.
+
+    p_dtype : {"float64", "float32"}, default is "float64", optional
+        The dtype for storing p-values. "float32" halves the memory of this column,
+        but p-values smaller than ~1.2e-38 will be set to be the smallest normal
+        float32 value.
+
+    threads : integer, default is 1, optional
+        Number of threads for inflating the blocks of a bgzipped file in parallel.
+
+    sep : string, default is "\\t", optional
+        Delimiter of the text input file.
+
+    cache_dir : string, or None, optional
+        If set, the loaded columns are kept in this directory as ``.npy`` files
+        (see ``SumstatsCache``), and they are loaded from there when the same
+        input file is read with the same options again, until the file is
+        changed. The IDs of all the sites are cached, so that the entry is shared
+        by any ``sign_marker_p``. It's not used with ``region``. Default: None,
+        no cache.
+
+    cache_max_size : integer, default is 20GB, optional
+        The largest total size in bytes of ``cache_dir``, the least recently used
+        data are removed from the cache when it's exceeded.
+
+    Returns
+    -------
+    data : DataFrame
+        A DataFrame with columns ``chrom`` (categorical), ``pos`` (uint32), ``pv``
+        and ``snp`` (if provided). Rows which have NaN in any of these columns are
+        dropped.
+    """
+    if p_dtype not in ("float64", "float32"):
+        raise ValueError("[ERROR] ``p_dtype`` must be one of \"float64\" or \"float32\".")
+
+    if region is not None:
+        kwargs = dict(chrom=chrom, pos=pos, pv=pv, snp=snp, sign_marker_p=sign_marker_p,
+                      max_p=max_p, p_dtype=p_dtype, threads=threads, sep=sep)
+        return next(read_sumstats_regions(fname, [region], **kwargs))
+
+    if cache_dir is not None:
+        # The options which change the loaded data are a part of the key. The IDs
+        # of all the sites are cached, ``sign_marker_p`` is applied after loading
+        # so that one entry serves any cutoff.
+        options = dict(chrom=chrom, pos=pos, pv=pv, snp=snp,
+                       CHR=sorted([CHR] if isinstance(CHR, str) else CHR) if CHR is not None else None,
+                       max_p=max_p, p_dtype=p_dtype, sep=sep)
+        cache = SumstatsCache(cache_dir, max_size=cache_max_size)
+        key = cache.key(fname, **options)
+        data = cache.load(key, sign_marker_p=sign_marker_p)
+        if data is None:
+            # Only the IDs under ``sign_marker_p`` are kept in memory, the IDs of
+            # all the sites are written to the new entry chunk by chunk.
+            ids = cache.id_writer() if snp is not None else None
+            try:
+                data = _read_sumstats(fname, sign_marker_p=sign_marker_p, chunksize=chunksize,
+                                      threads=threads, id_writer=ids, **options)
+            except BaseException:
+                if ids is not None:
+                    ids.discard()
+                raise
+
+            cache.save(key, data, snp=snp, pv=pv, ids=ids)
+
+        return data
+
+    return _read_sumstats(fname, chrom=chrom, pos=pos, pv=pv, snp=snp, sign_marker_p=sign_marker_p,
+                          CHR=CHR, max_p=max_p, chunksize=chunksize, p_dtype=p_dtype, threads=threads,
+                          sep=sep)
+
+
+def _read_sumstats(fname, chrom, pos, pv, snp, sign_marker_p, CHR, max_p, chunksize, p_dtype, threads,
+                   sep, id_writer=None):
+    """``read_sumstats`` without the cache, the IDs of all the sites are passed to
+    ``id_writer`` if it's set."""
+    if isinstance(CHR, str):
+        CHR = [CHR]
+
+    columns = [chrom, pos, pv] + ([snp] if snp is not None else [])
+    params = dict(chrom=chrom, pos=pos, pv=pv, snp=snp, sign_marker_p=sign_marker_p,
+                  CHR=CHR, max_p=max_p, p_dtype=p_dtype, id_writer=id_writer)
+
+    file_format = _sniff_format(fname)
+    if file_format in ("parquet", "ipc"):
+        return _reduce_chunks(_arrow_chunks(fname, file_format, columns, chrom, pv, CHR, max_p), **params)
+
+    text_params = dict(sep=sep, usecols=columns, dtype={chrom: "category", pv: np.float64},
+                       chunksize=chunksize)
+    if file_format == "bgzf":
+        with io.BufferedReader(_BgzfReader(fname, threads=threads), buffer_size=1 << 20) as fh:
+            return _reduce_chunks(_text_chunks(fh, compression=None, **text_params), **params)
+
+    return _reduce_chunks(_text_chunks(fname, compression=file_format, **text_params), **params)
+
+
+def read_sumstats_regions(fname, regions, chrom="#CHROM", pos="POS", pv="P", snp=None,
+                          sign_marker_p=None, max_p=None, p_dtype="float64", threads=1, sep="\t"):
+    """Load the sites of many regions from one bgzipped and tabix-indexed file.
+
+    The file and its .tbi/.csi index are opened only once, and every region
+    only reads the BGZF blocks that the index points to.
+
+    Parameters
+    ----------
+    fname : string
+        Path of a bgzipped and tabix-indexed file, e.g. indexed by
+        ``tabix -s 1 -b 2 -e 2 -c "#" file.tsv.gz``. The first line of the file
+        must be the header line which starts with the meta character of the index.
+
+    regions : iterable
+        Regions in the form of "chr8:1,000,000-2,000,000" or ("chr8", 1000000, 2000000).
+
+    chrom, pos, pv, snp, sign_marker_p, max_p, p_dtype, threads, sep :
+        See ``read_sumstats``.
+
+    Yields
+    ------
+    data : DataFrame
+        One DataFrame per region, in the order of ``regions``. It's empty if no
+        site is found in the region.
+    """
+    index = TabixIndex(fname)
+    columns = [chrom, pos, pv] + ([snp] if snp is not None else [])
+
+    with open(fname, "rb") as fh, ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        with io.BufferedReader(_BgzfReader(fname)) as bgzf:
+            header = bgzf.readline().decode().rstrip("\r\n")
+        if not header.startswith(index.meta):
+            raise ValueError("[ERROR] The first line of %s must be the header line which starts "
+                             "with '%s'." % (fname, index.meta))
+        names = header.split(sep)
+
+        for region in regions:
+            seqid, start, end = parse_region(region)
+
+            text = b"".join(_read_bgzf_range(fh, cbeg, cend, executor)
+                            for cbeg, cend in index.chunks(seqid, start, end))
+            chunk = pd.read_table(io.BytesIO(text), sep=sep, header=None, names=names,
+                                  usecols=columns, dtype={chrom: str, pv: np.float64},
+                                  comment=None) if text else pd.DataFrame(columns=columns)
+
+            # The indexed blocks also hold the records nearby, only keep the ones in the region.
+            is_in = (chunk[chrom] == seqid) & (chunk[pos] >= start) & (chunk[pos] <= end)
+            yield _reduce_chunks([chunk[is_in]], chrom, pos, pv, snp=snp, sign_marker_p=sign_marker_p,
+                                 max_p=max_p, p_dtype=p_dtype, allow_empty=True)
+
+
+def _read_bgzf_range(fh, voffset_beg, voffset_end, executor):
+    """Inflate the data between two BGZF virtual offsets."""
+    cbeg, ubeg = voffset_beg >> 16, voffset_beg & 0xFFFF
+    cend, uend = voffset_end >> 16, voffset_end & 0xFFFF
+
+    fh.seek(cbeg)
+    blocks, last_start = [], None
+    while fh.tell() < cend or (fh.tell() == cend and uend):
+        last_start = fh.tell()
+        block = _read_bgzf_block(fh)
+        if block is None:
+            last_start = None
+            break
+        blocks.append(block)
+
+    data = list(executor.map(_inflate_bgzf_block, blocks))
+    if not data:
+        return b""
+
+    if last_start == cend:
+        data[-1] = data[-1][:uend]
+    data[0] = data[0][ubeg:]
+    return b"".join(data)
+
+
+def _text_chunks(fname, chunksize=None, **kwargs):
+    """Parse a delimited text file (a path or a binary file handle) into DataFrame blocks."""
+    reader = pd.read_table(fname, chunksize=chunksize, **kwargs)
+    return [reader] if chunksize is None else reader
+
+
+def _arrow_chunks(fname, file_format, columns, chrom, pv, CHR=None, max_p=None):
+    """Scan a Parquet/Arrow dataset into DataFrame blocks with the filters pushed down."""
+    try:
+        import pyarrow.dataset as ds
+        import pyarrow.types as pa_types
+    except ImportError:
+        raise ImportError("[ERROR] Reading Parquet/Arrow input requires ``pyarrow``. "
+                          "Please install it by: pip install pyarrow")
+
+    # Partition directories like "CHROM=8/" are read as string keys, so that
+    # they can be compared with the chromosome names.
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    dataset = ds.dataset(fname, format=file_format, partitioning=partitioning)
+
+    expr = None
+    if CHR is not None:
+        if pa_types.is_integer(dataset.schema.field(chrom).type):
+            CHR = [int(c) for c in CHR if c.isdigit()]
+        expr = ds.field(chrom).isin(CHR)
+    if max_p is not None:
+        p_expr = ds.field(pv) <= max_p
+        expr = p_expr if expr is None else (expr & p_expr)
+
+    for batch in dataset.to_batches(columns=columns, filter=expr):
+        yield batch.to_pandas()
+
+
+def _reduce_chunks(chunks, chrom, pos, pv, snp=None, sign_marker_p=None, CHR=None, max_p=None,
+                   p_dtype="float64", allow_empty=False, id_writer=None):
+    """Reduce DataFrame blocks to the compact columns returned by ``read_sumstats``,
+    the IDs of all the sites are passed to ``id_writer`` block by block if it's set."""
+    chrom_ids, positions, p_values = [], [], []
+    sign_rows, sign_ids = [], []
+    n, n_tiny = 0, 0
+    for chunk in chunks:
+        chunk = chunk.dropna(how="any", axis=0)
+        if not isinstance(chunk[chrom].dtype, pd.CategoricalDtype):
+            chunk[chrom] = chunk[chrom].astype(str).astype("category")
+        else:
+            chunk[chrom] = chunk[chrom].cat.rename_categories(lambda c: str(c))
+
+        if CHR is not None:
+            chunk = chunk[chunk[chrom].isin(CHR)]
+        if max_p is not None:
+            chunk = chunk[chunk[pv] <= max_p]
+
+        site = chunk[pos].to_numpy()
+        if len(site) and (site.min() < 0 or site.max() > np.iinfo(np.uint32).max):
+            raise ValueError("[ERROR] Column \"%s\" must be in [0, %d]." % (pos, np.iinfo(np.uint32).max))
+
+        p_value = chunk[pv].to_numpy(dtype=np.float64)
+        if p_dtype == "float32":
+            tiny = np.finfo(np.float32).tiny
+            is_tiny = (p_value > 0) & (p_value < tiny)
+            n_tiny += is_tiny.sum()
+            p_value = np.where(is_tiny, tiny, p_value).astype(np.float32)
+
+        chrom_ids.append(chunk[chrom].cat.remove_unused_categories().values)
+        positions.append(site.astype(np.uint32))
+        p_values.append(p_value)
+
+        if snp is not None:
+            is_keep = (chunk[pv] <= sign_marker_p).to_numpy() if sign_marker_p is not None else \
+                np.ones(len(chunk), dtype=bool)
+            sign_rows.append(n + np.flatnonzero(is_keep))
+            sign_ids.append(chunk[snp].to_numpy()[is_keep])
+            if id_writer is not None:
+                id_writer.append(chunk[snp].to_numpy())
+
+        n += len(chunk)
+
+    if n == 0 and not allow_empty:
+        raise ValueError("[ERROR] No data found in the input file.")
+
+    if n_tiny:
+        print("[WARNING] %d p-values are smaller than the smallest float32 value and have been "
+              "set to be %g." % (n_tiny, np.finfo(np.float32).tiny))
+
+    data = pd.DataFrame({chrom: union_categoricals(chrom_ids),
+                         pos: np.concatenate(positions),
+                         pv: np.concatenate(p_values)})
+    if snp is not None:
+        # Keep the IDs as a categorical: one small code per row, plus the ID
+        # strings of the kept sites only.
+        codes = np.full(n, -1, dtype=np.int32)
+        id_codes, id_names = pd.factorize(np.concatenate(sign_ids))
+        codes[np.concatenate(sign_rows)] = id_codes
+        data[snp] = pd.Categorical.from_codes(codes, categories=id_names)
+
+    return data
+
+
+def _sniff_format(fname):
+    """Detect the format or compression of ``fname`` by its magic number.
+
+    Returns
+    -------
+    "parquet", "ipc", "bgzf", "gzip", "zstd" or "infer" (let pandas decide by
+    the file suffix).
+    """
+    if os.path.isdir(fname):
+        return "parquet"
+
+    with open(fname, "rb") as fh:
+        header = fh.read(16)
+
+    if header[:4] == _PARQUET_MAGIC:
+        return "parquet"
+    if header[:6] == _ARROW_MAGIC:
+        return "ipc"
+
+    if header[:2] == _GZIP_MAGIC:
+        # BGZF is a gzip file with a "BC" extra subfield in every block header.
+        is_bgzf = len(header) >= 16 and (header[3] & 4) and header[12:14] == b"BC"
+        return "bgzf" if is_bgzf else "gzip"
+    if header[:4] == _ZSTD_MAGIC:
+        return "zstd"
+
+    return "infer"
+
+
+def _read_bgzf_block(fh):
+    """Return the compressed data (plus CRC32 and ISIZE) of the next BGZF block in ``fh``, or None at EOF."""
+    header = fh.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+        raise ValueError("[ERROR] Invalid BGZF block header.")
+
+    xlen, = struct.unpack("<H", header[10:12])
+    extra = fh.read(xlen)
+    bsize, i = None, 0
+    while i + 4 <= xlen:
+        slen, = struct.unpack("<H", extra[i + 2:i + 4])
+        if extra[i:i + 2] == b"BC":
+            bsize, = struct.unpack("<H", extra[i + 4:i + 6])
+        i += 4 + slen
+
+    if bsize is None:
+        raise ValueError("[ERROR] BGZF block without the \"BC\" subfield.")
+
+    # BSIZE is the total block size minus 1.
+    return fh.read(bsize + 1 - 12 - xlen)
+
+
+def _inflate_bgzf_block(block):
+    """Inflate the compressed data of one BGZF block and check its CRC32."""
+    data = zlib.decompress(block[:-8], -15)
+    crc, size = struct.unpack("<II", block[-8:])
+    if zlib.crc32(data) != crc or len(data) != size:
+        raise ValueError("[ERROR] BGZF block is corrupted (CRC32 or size mismatch).")
+    return data
+
+
+class _BgzfReader(io.RawIOBase):
+    """A read-only binary stream over a BGZF (bgzip) file.
+
+    BGZF is a series of independent gzip blocks (<= 64 KB each), so the blocks
+    are read in order and inflated by a pool of threads (``zlib`` releases the
+    GIL), while the stream returns the inflated data in the original order.
+    """
+    def __init__(self, fname, threads=1, blocks_per_thread=16):
+        super().__init__()
+        self._fh = open(fname, "rb")
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._queue_size = max(1, threads) * blocks_per_thread
+        self._pending = deque()
+        self._buffer = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def _fill_queue(self):
+        while len(self._pending) < self._queue_size:
+            block = _read_bgzf_block(self._fh)
+            if block is None:
+                break
+            self._pending.append(self._executor.submit(_inflate_bgzf_block, block))
+
+    def readinto(self, b):
+        while self._offset >= len(self._buffer):
+            self._fill_queue()
+            if not self._pending:
+                return 0  # EOF
+
+            self._buffer = self._pending.popleft().result()
+            self._offset = 0
+
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=True)
+            self._fh.close()
+        super().close()
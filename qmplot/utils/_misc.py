@@ -2,6 +2,7 @@
 """
 import operator
 import numpy as np
+from pandas import to_numeric
 from scipy import stats
 
 
@@ -81,6 +82,107 @@ def is_integer(s):
         return False
 
 
+def check_numeric(a, name="data"):
+    """Cast ``a`` to a float array and make sure all the values are finite
+    numbers.
+
+    It's the vectorized version of checking ``is_numeric()`` for each element.
+
+    Parameters
+    ----------
+    a : list, 1d-array-like, or Series
+
+    name : string, optional
+        The name of ``a`` in the error message.
+
+    Returns
+    -------
+    A 1d float64 array of ``a``.
+
+    Raises
+    ------
+    ValueError : if any of the values is not a number, NaN or inf. The message
+        reports the number and the first positions (index labels for ``Series``)
+        of each kind of bad values.
+    """
+    x, is_bad_type = _as_float(a)
+    _raise_if_bad(a, name, [("non-numeric value(s)", is_bad_type),
+                            ("NaN or inf value(s)", ~np.isfinite(x) & ~is_bad_type)])
+    return x
+
+
+def check_pvalues(a, name="P"):
+    """Cast ``a`` to a float array and make sure all the values are P values
+    in [0, 1].
+
+    Parameters
+    ----------
+    a : list, 1d-array-like, or Series
+
+    name : string, optional
+        The name of ``a`` in the error message.
+
+    Returns
+    -------
+    A 1d float64 array of ``a``.
+
+    Raises
+    ------
+    ValueError : if any of the values is not a number, NaN or out of [0, 1]. The
+        message reports the number and the first positions (index labels for
+        ``Series``) of each kind of bad values.
+    """
+    x, is_bad_type = _as_float(a)
+    is_nan = np.isnan(x) & ~is_bad_type
+    _raise_if_bad(a, name, [("non-numeric value(s)", is_bad_type),
+                            ("NaN value(s)", is_nan),
+                            ("value(s) out of [0, 1]", ~((x >= 0) & (x <= 1)) & ~is_nan & ~is_bad_type)])
+    return x
+
+
+def _as_float(a):
+    """Cast ``a`` to a 1d float64 array by the dtype, the elements are only
+    parsed one by one if ``a`` is not a numeric array.
+
+    Returns
+    -------
+    (x, is_bad_type) : the float array (NaN for the elements which can't be
+        parsed) and the boolean mask of the elements which can't be parsed.
+    """
+    values = a.to_numpy() if hasattr(a, "to_numpy") else np.asarray(a)
+    values = values.ravel()
+    if values.dtype.kind in "biuf":
+        return values.astype(np.float64, copy=False), np.zeros(len(values), dtype=bool)
+
+    x = np.asarray(to_numeric(values, errors="coerce"), dtype=np.float64)
+    is_bad_type = np.isnan(x)
+    if is_bad_type.any():
+        # The missing values (None, NaN, "nan") are NaN rather than non-numeric.
+        is_bad_type[is_bad_type] = [not (v is None or str(v).strip().lower() == "nan")
+                                    for v in values[is_bad_type]]
+    return x, is_bad_type
+
+
+def _raise_if_bad(a, name, checks, max_show=5):
+    """Raise ``ValueError`` which reports all the failed ``checks``, a list of
+    (description, bad_mask)."""
+    msg = []
+    for desc, is_bad in checks:
+        n_bad = np.count_nonzero(is_bad)
+        if n_bad == 0:
+            continue
+
+        idx = np.flatnonzero(is_bad)[:max_show]
+        index = a.index if hasattr(a, "iloc") else None
+        where = list(index[idx]) if index is not None else idx.tolist()
+        msg.append("%d %s at %s%s" % (n_bad, desc, ", ".join(map(str, where)),
+                                      ", ..." if n_bad > max_show else ""))
+
+    if msg:
+        raise ValueError("[ERROR] Found invalid values in `%s` (%d values): %s" % (
+            name, len(is_bad), "; ".join(msg)))
+
+
 def iqr(a):
     """Calculate the IQR for an array of numbers."""
     a = np.asarray(a)
@@ -0,0 +1,172 @@
+"""A minimal reader of tabix (.tbi) and CSI (.csi) indexes for ``qmplot``.
+
+See the format specification: https://samtools.github.io/hts-specs/tabix.pdf
+and https://samtools.github.io/hts-specs/CSIv1.pdf
+
+Author: Shujia Huang
+Date: 2026-10-18
+"""
+import gzip
+import os
+import re
+import struct
+
+_MAX_POS = (1 << 31) - 1
+
+
+def parse_region(region):
+    """Parse a region string in samtools/tabix style.
+
+    Parameters
+    ----------
+    region : string or tuple
+        "chr8", "chr8:1000000" or "chr8:1,000,000-2,000,000" (1-based, inclusive),
+        or a tuple of (chrom, start, end).
+
+    Returns
+    -------
+    (chrom, start, end) : the 1-based, inclusive region.
+    """
+    if not isinstance(region, str):
+        chrom, start, end = region
+        return str(chrom), int(start), int(end)
+
+    m = re.match(r"^(.+?)(?::([\d,]+)(?:-([\d,]+))?)?$", region.strip())
+    if m is None:
+        raise ValueError("[ERROR] Invalid region: \"%s\"" % region)
+
+    chrom, start, end = m.groups()
+    start = int(start.replace(",", "")) if start else 1
+    end = int(end.replace(",", "")) if end else _MAX_POS
+    if start > end:
+        raise ValueError("[ERROR] Invalid region: \"%s\", start > end." % region)
+
+    return chrom, start, end
+
+
+class TabixIndex(object):
+    """The content of a .tbi or .csi index which is needed for region queries.
+
+    Parameters
+    ----------
+    fname : string
+        The bgzipped data file, the index is ``fname + ".tbi"`` or ``fname + ".csi"``.
+    """
+    def __init__(self, fname):
+        if os.path.exists(fname + ".tbi"):
+            self._load_tbi(fname + ".tbi")
+        elif os.path.exists(fname + ".csi"):
+            self._load_csi(fname + ".csi")
+        else:
+            raise ValueError("[ERROR] No tabix index (%s.tbi or %s.csi) found." % (fname, fname))
+
+    def _load_header(self, buf, offset):
+        """Parse the tabix header (format ... names) which starts at ``offset``."""
+        (self.format, self.col_seq, self.col_beg, self.col_end,
+         meta, self.skip, l_nm) = struct.unpack_from("<7i", buf, offset)
+        offset += 28
+        self.meta = chr(meta)
+        names = buf[offset:offset + l_nm].split(b"\0")
+        self.names = {name.decode(): i for i, name in enumerate(names) if name}
+        return offset + l_nm
+
+    def _load_tbi(self, fname):
+        with gzip.open(fname, "rb") as fh:
+            buf = fh.read()
+
+        if buf[:4] != b"TBI\1":
+            raise ValueError("[ERROR] %s is not a tabix index." % fname)
+
+        n_ref, = struct.unpack_from("<i", buf, 4)
+        offset = self._load_header(buf, 8)
+        self.min_shift, self.depth = 14, 5
+
+        self.bins, self.linear = [], []
+        for _ in range(n_ref):
+            bins = {}
+            n_bin, = struct.unpack_from("<i", buf, offset)
+            offset += 4
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from("<Ii", buf, offset)
+                offset += 8
+                bins[bin_id] = list(struct.iter_unpack("<QQ", buf[offset:offset + 16 * n_chunk]))
+                offset += 16 * n_chunk
+
+            n_intv, = struct.unpack_from("<i", buf, offset)
+            offset += 4
+            self.linear.append(struct.unpack_from("<%dQ" % n_intv, buf, offset))
+            offset += 8 * n_intv
+            self.bins.append(bins)
+
+    def _load_csi(self, fname):
+        with gzip.open(fname, "rb") as fh:
+            buf = fh.read()
+
+        if buf[:4] != b"CSI\1":
+            raise ValueError("[ERROR] %s is not a CSI index." % fname)
+
+        self.min_shift, self.depth, l_aux = struct.unpack_from("<3i", buf, 4)
+        if l_aux < 28:
+            raise ValueError("[ERROR] %s has no tabix header, it's not an index of a "
+                             "tab-delimited file." % fname)
+        self._load_header(buf, 16)
+        offset = 16 + l_aux
+
+        n_ref, = struct.unpack_from("<i", buf, offset)
+        offset += 4
+        self.bins, self.linear = [], []
+        for _ in range(n_ref):
+            bins = {}
+            n_bin, = struct.unpack_from("<i", buf, offset)
+            offset += 4
+            for _ in range(n_bin):
+                bin_id, _loffset, n_chunk = struct.unpack_from("<IQi", buf, offset)
+                offset += 16
+                bins[bin_id] = list(struct.iter_unpack("<QQ", buf[offset:offset + 16 * n_chunk]))
+                offset += 16 * n_chunk
+
+            self.bins.append(bins)
+            self.linear.append(())  # CSI has no linear index
+
+    def _reg2bins(self, beg, end):
+        """All the bins which may overlap with [beg, end) (0-based)."""
+        bins = []
+        end -= 1
+        s, t = self.min_shift + self.depth * 3, 0
+        for level in range(self.depth + 1):
+            bins.extend(range(t + (beg >> s), t + (end >> s) + 1))
+            t += 1 << (level * 3)
+            s -= 3
+        return bins
+
+    def chunks(self, chrom, start, end):
+        """The merged virtual-offset chunks of the BGZF file which may hold
+        the records in region ``chrom:start-end`` (1-based, inclusive).
+
+        Returns
+        -------
+        A sorted list of (begin, end) virtual offsets, empty if ``chrom`` is
+        not in the index.
+        """
+        if chrom not in self.names:
+            return []
+
+        tid = self.names[chrom]
+        beg = max(start - 1, 0)
+        bins, linear = self.bins[tid], self.linear[tid]
+
+        min_offset = 0
+        if linear:
+            min_offset = linear[min(beg >> self.min_shift, len(linear) - 1)]
+
+        chunks = sorted(c for b in self._reg2bins(beg, min(end, 1 << (self.min_shift + self.depth * 3)))
+                        if b in bins for c in bins[b] if c[1] > min_offset)
+
+        merged = []
+        for cbeg, cend in chunks:
+            if merged and cbeg <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], cend)
+            else:
+                merged.append([cbeg, cend])
+
+        return [tuple(c) for c in merged]